@@ -1,28 +1,55 @@
 import json
-from laserembeddings import Laser
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
 import pandas as pd
+from text_normalize import normalize_text
+from embedding_cache import EmbeddingCache, encode_cached
+from embedding_client import encode_laser
+from alignment_engine import tiled_top_k
+from monotonic_alignment import banded_align
 
 def extract_lines_from_jsonl(jsonl_path, key='text'):
     lines = []
     with open(jsonl_path, 'r', encoding='utf-8') as f:
         for line in f:
             data = json.loads(line)
-            if key in data and data[key].strip():
-                lines.append(data[key].strip())
+            text = normalize_text(data.get(key))
+            if isinstance(text, str) and text:
+                lines.append(text)
     return lines
 
-def align_sentences(base_lines, other_lines, laser, base_lang='en', other_lang='xx', threshold=0.75):
-    base_embeddings = laser.embed_sentences(base_lines, lang=base_lang)
-    other_embeddings = laser.embed_sentences(other_lines, lang=other_lang)
+# laser=None encodes through the warm embedding server (or an in-process model when it is down)
+def embed_lines(lines, laser, lang, cache=None):
+    if laser is None:
+        return encode_cached(cache, lines, lambda texts: encode_laser(texts, lang), "laser", lang)
+    return encode_cached(cache, lines, lambda texts: laser.embed_sentences(texts, lang=lang), "laser", lang)
 
-    similarity_matrix = cosine_similarity(base_embeddings, other_embeddings)
+# Best match per base line from a tiled top-1 search; memory is bounded by
+# tile_size rather than the full base x other similarity matrix.
+# method='banded' instead follows document order within `band` lines of the
+# diagonal; a base line matched to two other lines gets them joined with a space.
+def align_sentences(base_lines, other_lines, laser, base_lang='en', other_lang='xx', threshold=0.75,
+                    cache=None, tile_size=4096, method='top1', band=16):
+    base_embeddings = embed_lines(base_lines, laser, base_lang, cache)
+    other_embeddings = embed_lines(other_lines, laser, other_lang, cache)
+    return align_embedded(base_lines, other_lines, base_embeddings, other_embeddings, threshold,
+                          tile_size, method, band)
+
+# align_sentences for lines that are already embedded
+def align_embedded(base_lines, other_lines, base_embeddings, other_embeddings, threshold=0.75,
+                   tile_size=4096, method='top1', band=16):
+    if not other_lines:
+        return [(line, None, 0.0) for line in base_lines]
+
+    if method == 'banded':
+        alignment = []
+        for base_idx, other_idx, score in banded_align([(base_embeddings, other_embeddings)], band):
+            match = " ".join(other_lines[j] for j in other_idx) if other_idx and score >= threshold else None
+            alignment.extend((base_lines[i], match, score) for i in base_idx)
+        return alignment
+
+    best_idx, best_scores = tiled_top_k(base_embeddings, other_embeddings, k=1, tile_size=tile_size)
     alignment = []
 
-    for i, row in enumerate(similarity_matrix):
-        best_match_idx = np.argmax(row)
-        best_score = row[best_match_idx]
+    for i, (best_match_idx, best_score) in enumerate(zip(best_idx[:, 0], best_scores[:, 0])):
         if best_score >= threshold:
             alignment.append((base_lines[i], other_lines[best_match_idx], best_score))
         else:
@@ -30,30 +57,52 @@ def align_sentences(base_lines, other_lines, laser, base_lang='en', other_lang='
 
     return alignment
 
-def build_multilang_dataset_from_jsonl(eng_path, tam_path, sin_path, key='text'):
-    laser = Laser()
+LANGUAGE_NAMES = {'en': 'English', 'ta': 'Tamil', 'si': 'Sinhala'}
 
-    eng_lines = extract_lines_from_jsonl(eng_path, key)
-    tam_lines = extract_lines_from_jsonl(tam_path, key)
-    sin_lines = extract_lines_from_jsonl(sin_path, key)
+# Align any number of languages, given as {LASER language code: jsonl path}, to the
+# pivot language. Every language is embedded exactly once, so adding a language
+# costs one more embedding pass and one more alignment against the pivot. Rows are
+# joined on the pivot line; for the second and later languages the first match wins.
+def build_multilang_dataset(paths, pivot='en', key='text', cache_dir='embedding_cache/laser', laser=None,
+                            threshold=0.75, method='top1'):
+    others = [lang for lang in paths if lang != pivot]
+    if pivot not in paths or not others:
+        raise ValueError(f"Need the pivot language '{pivot}' and at least one other language, got {list(paths)}")
+    cache = EmbeddingCache(cache_dir) if cache_dir else None
 
-    # Align Tamil with English
-    tam_alignment = align_sentences(eng_lines, tam_lines, laser, base_lang='en', other_lang='ta')
-    aligned_eng_tam = [(eng, tam) for eng, tam, score in tam_alignment if tam]
+    lines = {lang: extract_lines_from_jsonl(path, key) for lang, path in paths.items()}
+    embeddings = {lang: embed_lines(lines[lang], laser, lang, cache) for lang in paths}
+    alignments = {
+        lang: align_embedded(lines[pivot], lines[lang], embeddings[pivot], embeddings[lang], threshold, method=method)
+        for lang in others
+    }
 
-    # Align Sinhala with English
-    sin_alignment = align_sentences(eng_lines, sin_lines, laser, base_lang='en', other_lang='si')
-    aligned_eng_sin = [(eng, sin) for eng, sin, score in sin_alignment if sin]
+    # Merge based on the pivot sentence (hash join)
+    matches = {}
+    for lang in others[1:]:
+        matches[lang] = {}
+        for base, other, score in alignments[lang]:
+            if other:
+                matches[lang].setdefault(base, other)
 
-    # Merge based on English sentence
     dataset = []
-    for eng, tam in aligned_eng_tam:
-        sin = next((s for e, s in aligned_eng_sin if e == eng), None)
-        if sin:
-            dataset.append((eng, tam, sin))
+    for base, other, score in alignments[others[0]]:
+        if not other:
+            continue
+        row = [base, other] + [matches[lang].get(base) for lang in others[1:]]
+        if all(row):
+            dataset.append(tuple(row))
+
+    if cache is not None:
+        cache.save()
+        print(f"Embedding cache: {cache.hits} hits, {cache.misses} misses")
+
+    columns = [LANGUAGE_NAMES.get(lang, lang) for lang in [pivot] + others]
+    return pd.DataFrame(dataset, columns=columns)
 
-    df = pd.DataFrame(dataset, columns=["English", "Tamil", "Sinhala"])
-    return df
+def build_multilang_dataset_from_jsonl(eng_path, tam_path, sin_path, key='text', cache_dir='embedding_cache/laser',
+                                       laser=None):
+    return build_multilang_dataset({'en': eng_path, 'ta': tam_path, 'si': sin_path}, 'en', key, cache_dir, laser)
 
 # Example usage
 eng_jsonl = 'output/appropriation_en.jsonl'
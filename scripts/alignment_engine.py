@@ -0,0 +1,301 @@
+import numpy as np
+
+from metrics import metrics
+from quantization import quantize, quantized_similarity
+
+ALIGNMENT_MODES = ("row_greedy", "global_greedy", "optimal", "banded")
+
+
+# Scale each embedding to unit length so a dot product is the cosine similarity
+def normalize_rows(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if embeddings.ndim == 1:
+        embeddings = embeddings[None, :]
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-8)
+
+
+# Similarity block for every pair of languages in one pass over {lang: embeddings}.
+# Each language is normalized (and quantized) once; blocks[(a, b)] is a x b and
+# blocks[(b, a)] its transpose view. With precision "float16" or "int8" the
+# normalized embeddings are held quantized and widened block by block.
+def pairwise_similarities(embeddings, precision="float32"):
+    langs = list(embeddings)
+    blocks = {}
+    with metrics.timer("similarity_matrix_seconds", kind="dense"):
+        normalized = {lang: normalize_rows(embeddings[lang]) for lang in langs}
+        if precision != "float32":
+            quantized = {lang: quantize(normalized[lang], precision) for lang in langs}
+        for i, a in enumerate(langs):
+            for b in langs[i + 1:]:
+                if precision == "float32":
+                    sim = normalized[a] @ normalized[b].T
+                else:
+                    sim = quantized_similarity(*quantized[a], *quantized[b])
+                blocks[(a, b)] = sim
+                blocks[(b, a)] = sim.T
+    return blocks
+
+
+# Best k columns of other for every row of base by cosine similarity, computed over
+# row_block x tile_size tiles so memory stays bounded by the tile rather than n x m.
+# Returns (indices, scores), both n x k, sorted by descending score.
+def tiled_top_k(base_embeddings, other_embeddings, k=1, tile_size=4096, row_block=4096):
+    with metrics.timer("similarity_matrix_seconds", kind="tiled"):
+        return _tiled_top_k(base_embeddings, other_embeddings, k, tile_size, row_block)
+
+
+def _tiled_top_k(base_embeddings, other_embeddings, k, tile_size, row_block):
+    n_rows, n_cols = len(base_embeddings), len(other_embeddings)
+    k = min(k, n_cols)
+    top_idx = np.zeros((n_rows, k), dtype=np.int64)
+    top_scores = np.zeros((n_rows, k), dtype=np.float32)
+    if k == 0:
+        return top_idx, top_scores
+
+    for r0 in range(0, n_rows, row_block):
+        rows = normalize_rows(base_embeddings[r0:r0 + row_block])
+        block_scores = np.full((len(rows), k), -np.inf, dtype=np.float32)
+        block_idx = np.zeros((len(rows), k), dtype=np.int64)
+
+        for c0 in range(0, n_cols, tile_size):
+            sims = rows @ normalize_rows(other_embeddings[c0:c0 + tile_size]).T
+            kk = min(k, sims.shape[1])
+            cand = np.argpartition(-sims, kk - 1, axis=1)[:, :kk]
+            cand_scores = np.take_along_axis(sims, cand, axis=1)
+
+            # Keep the best k of the running candidates and this tile's candidates
+            merged_scores = np.concatenate([block_scores, cand_scores], axis=1)
+            merged_idx = np.concatenate([block_idx, cand + c0], axis=1)
+            keep = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+            block_scores = np.take_along_axis(merged_scores, keep, axis=1)
+            block_idx = np.take_along_axis(merged_idx, keep, axis=1)
+
+        order = np.argsort(-block_scores, axis=1, kind="stable")
+        top_scores[r0:r0 + len(rows)] = np.take_along_axis(block_scores, order, axis=1)
+        top_idx[r0:r0 + len(rows)] = np.take_along_axis(block_idx, order, axis=1)
+
+    return top_idx, top_scores
+
+
+# Greedy in English row order; masks already used columns like the original loop
+def assign_row_greedy(sim):
+    n_rows, n_cols = sim.shape
+    used = np.zeros(n_cols, dtype=bool)
+    cols = np.empty(n_rows, dtype=np.int64)
+    scores = np.empty(n_rows, dtype=np.float32)
+    for i in range(n_rows):
+        row = np.where(used, -1.0, sim[i])
+        best = int(np.argmax(row))
+        cols[i] = best
+        scores[i] = row[best]
+        used[best] = True
+    return np.arange(n_rows), cols, scores
+
+
+# Greedy by global score: take the best remaining pair anywhere in the matrix.
+# Instead of sorting every cell, each round sorts only the top k cells of every free
+# row (ties with the k-th included). A free row whose candidates were all taken may
+# still hold its best remaining pair below its k-th score, so the round stops at the
+# highest such k-th score; the next round rebuilds the candidates over the rows and
+# columns still free with twice the k. The pairs are the same as a full sort's.
+def assign_global_greedy(sim, k=8, row_block=1024):
+    n_rows, n_cols = sim.shape
+    limit = min(n_rows, n_cols)
+    free_rows = np.arange(n_rows)
+    free_cols = np.arange(n_cols)
+    rows, cols = [], []
+    while len(rows) < limit:
+        # The first round reads sim itself; later rounds copy the (smaller) free block
+        sub = sim if not rows else sim[np.ix_(free_rows, free_cols)]
+        kk = min(k, len(free_cols))
+        kth = np.empty(len(free_rows), dtype=sub.dtype)
+        cand_rows, cand_cols = [], []
+        for r0 in range(0, len(free_rows), row_block):
+            block = sub[r0:r0 + row_block]
+            kth[r0:r0 + len(block)] = np.partition(block, len(free_cols) - kk, axis=1)[:, len(free_cols) - kk]
+            r, c = np.nonzero(block >= kth[r0:r0 + len(block), None])
+            cand_rows.append(r + r0)
+            cand_cols.append(c)
+        cand_rows, cand_cols = np.concatenate(cand_rows), np.concatenate(cand_cols)
+        cand_scores = sub[cand_rows, cand_cols]
+        del sub
+        # Highest score first, then row-major order like a stable sort of the flat matrix
+        order = np.lexsort((cand_cols, cand_rows, -cand_scores))
+
+        remaining = np.bincount(cand_rows, minlength=len(free_rows))
+        row_used = np.zeros(len(free_rows), dtype=bool)
+        col_used = np.zeros(len(free_cols), dtype=bool)
+        boundary = -np.inf
+        for r, c, score in zip(cand_rows[order].tolist(), cand_cols[order].tolist(), cand_scores[order].tolist()):
+            if score < boundary:
+                break
+            if row_used[r]:
+                continue
+            if col_used[c]:
+                remaining[r] -= 1
+                if remaining[r] == 0:
+                    boundary = max(boundary, kth[r])
+                continue
+            row_used[r] = True
+            col_used[c] = True
+            rows.append(free_rows[r])
+            cols.append(free_cols[c])
+            if len(rows) == limit:
+                break
+
+        free_rows = free_rows[~row_used]
+        free_cols = free_cols[~col_used]
+        k *= 2
+
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    keep = np.argsort(rows, kind="stable")
+    rows, cols = rows[keep], cols[keep]
+    return rows, cols, sim[rows, cols]
+
+
+# Optimal one-to-one assignment maximizing the total similarity (needs scipy)
+def assign_optimal(sim):
+    try:
+        from scipy.optimize import linear_sum_assignment
+    except ImportError as e:
+        raise ImportError("Alignment mode 'optimal' requires scipy to be installed.") from e
+
+    rows, cols = linear_sum_assignment(sim, maximize=True)
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    return rows, cols, sim[rows, cols]
+
+
+ASSIGNERS = {
+    "row_greedy": assign_row_greedy,
+    "global_greedy": assign_global_greedy,
+    "optimal": assign_optimal,
+}
+
+
+def triplet_record(eng_text, tam_text, sin_text, et_score, es_score, ts_score):
+    et_score, es_score, ts_score = float(et_score), float(es_score), float(ts_score)
+    return {
+        "english": eng_text,
+        "tamil": tam_text,
+        "sinhala": sin_text,
+        "similarity": {
+            "eng_tam": round(et_score, 4),
+            "eng_sin": round(es_score, 4),
+            "tam_sin": round(ts_score, 4),
+            "combined_avg": round((et_score + es_score + ts_score) / 3, 4)
+        }
+    }
+
+
+# Keep the tuples in which every pair of members is, within `margin`, the best match
+# of both members in that language pair, so following the matches around any cycle
+# of languages (English → Tamil → Sinhala → English) comes back to the same tuple.
+def cycle_consistent(tuples, blocks, margin=0.05):
+    langs = list(tuples)
+    keep = np.ones(len(tuples[langs[0]]), dtype=bool)
+    for i, a in enumerate(langs):
+        for b in langs[i + 1:]:
+            sim = blocks[(a, b)]
+            scores = sim[tuples[a], tuples[b]]
+            best = np.maximum(sim.max(axis=1)[tuples[a]], sim.max(axis=0)[tuples[b]])
+            keep &= scores >= best - margin
+    return keep
+
+
+# N-way one-to-one alignment of {lang: embeddings}. Languages join in `order` (the
+# pivot first): each one is matched against the tuples built so far on the average
+# of its similarities to every language already in them, so each language costs one
+# more similarity block per language and one assignment. With cycle_margin set,
+# tuples failing cycle_consistent are dropped. Returns ({lang: index array},
+# {(a, b): score array}) with one entry per tuple.
+def align_languages(embeddings, order=None, mode="global_greedy", precision="float32", cycle_margin=None):
+    if mode not in ASSIGNERS:
+        raise ValueError(f"Unknown alignment mode '{mode}', expected one of {tuple(ASSIGNERS)}")
+    order = list(order or embeddings)
+    if len(order) < 2:
+        raise ValueError(f"Alignment needs at least two languages, got {order}")
+    pairs = [(a, b) for i, a in enumerate(order) for b in order[i + 1:]]
+    if any(len(embeddings[lang]) == 0 for lang in order):
+        return {lang: np.zeros(0, dtype=np.int64) for lang in order}, {pair: np.zeros(0, dtype=np.float32) for pair in pairs}
+
+    blocks = pairwise_similarities({lang: embeddings[lang] for lang in order}, precision)
+    assign = ASSIGNERS[mode]
+    tuples = {order[0]: np.arange(len(embeddings[order[0]]))}
+    with metrics.timer("alignment_assign_seconds", mode=mode):
+        for lang in order[1:]:
+            combined = sum(blocks[(member, lang)][idx] for member, idx in tuples.items()) / len(tuples)
+            rows, cols, assigned = assign(combined)
+            tuples = {member: idx[rows] for member, idx in tuples.items()}
+            tuples[lang] = cols
+            # The first pair keeps the assigner's scores (row_greedy reports -1 for a
+            # pivot row that found no free partner)
+            first_scores = assigned if len(tuples) == 2 else first_scores[rows]
+
+    keep = slice(None)
+    if cycle_margin is not None:
+        keep = cycle_consistent(tuples, blocks, cycle_margin)
+        tuples = {lang: idx[keep] for lang, idx in tuples.items()}
+    scores = {(a, b): blocks[(a, b)][tuples[a], tuples[b]] for a, b in pairs}
+    scores[pairs[0]] = first_scores[keep]
+    return tuples, scores
+
+
+# One N-way record: the text per language plus "<a>_<b>" scores and their average
+def tuple_record(texts, scores):
+    similarity = {f"{a}_{b}": round(float(score), 4) for (a, b), score in scores.items()}
+    if scores:
+        similarity["combined_avg"] = round(float(np.mean([float(s) for s in scores.values()])), 4)
+    return {**texts, "similarity": similarity}
+
+
+# Align any set of language files: {lang: jsonl path} -> list of tuple_record dicts.
+# encode_fn(lang, sentences) runs exactly once per language.
+def align_language_files(paths, encode_fn, pivot=None, mode="global_greedy", cycle_margin=None):
+    from jsonl_io import load_jsonl_sentences
+
+    order = list(paths)
+    if pivot is not None:
+        order = [pivot] + [lang for lang in order if lang != pivot]
+    sentences = {lang: load_jsonl_sentences(paths[lang]) for lang in order}
+    embeddings = {lang: encode_fn(lang, sentences[lang]) for lang in order}
+    tuples, scores = align_languages(embeddings, order, mode, cycle_margin=cycle_margin)
+    return [
+        tuple_record(
+            {lang: sentences[lang][tuples[lang][k]] for lang in order},
+            {pair: pair_scores[k] for pair, pair_scores in scores.items()},
+        )
+        for k in range(len(tuples[order[0]]))
+    ]
+
+
+# Align English/Tamil/Sinhala paragraphs and return records in the aligned_triplets schema.
+# Tamil is matched to English first; Sinhala is then matched against the average of the
+# English–Sinhala and Tamil–Sinhala scores. In the global modes English paragraphs left
+# without a partner (more English than Tamil/Sinhala paragraphs) are not emitted.
+# "banded" keeps document order and merges split paragraphs (monotonic_alignment.py).
+def align_triplets(english_sentences, tamil_sentences, sinhala_sentences,
+                   eng_embeddings, tam_embeddings, sin_embeddings, mode="global_greedy", precision="float32"):
+    if mode not in ALIGNMENT_MODES:
+        raise ValueError(f"Unknown alignment mode '{mode}', expected one of {ALIGNMENT_MODES}")
+    if not english_sentences or not tamil_sentences or not sinhala_sentences:
+        return []
+    if mode == "banded":
+        from monotonic_alignment import align_triplets_banded
+        return align_triplets_banded(english_sentences, tamil_sentences, sinhala_sentences,
+                                     eng_embeddings, tam_embeddings, sin_embeddings)
+
+    tuples, scores = align_languages(
+        {"eng": eng_embeddings, "tam": tam_embeddings, "sin": sin_embeddings}, mode=mode, precision=precision
+    )
+    et_scores, es_scores, ts_scores = scores[("eng", "tam")], scores[("eng", "sin")], scores[("tam", "sin")]
+
+    return [
+        triplet_record(
+            english_sentences[e], tamil_sentences[t], sinhala_sentences[s],
+            et_scores[k], es_scores[k], ts_scores[k]
+        )
+        for k, (e, t, s) in enumerate(zip(tuples["eng"], tuples["tam"], tuples["sin"]))
+    ]
@@ -0,0 +1,196 @@
+import os
+import json
+import numpy as np
+from alignment_engine import normalize_rows
+from response_cache import file_sha256
+
+INDEX_FILE = "index.json"
+VECTORS_FILE = "vectors.f32"
+LISTS_FILE = "lists.i32"
+CENTROIDS_FILE = "centroids.npy"
+METADATA_FILE = "metadata.jsonl"
+
+# Retrain the coarse quantizer once the index has grown this much since the last training
+RETRAIN_GROWTH = 4
+
+
+# Spherical k-means on unit vectors (cosine similarity), trained on a sample
+def spherical_kmeans(vectors, n_clusters, n_iter=10, sample_size=None, block=8192, seed=0):
+    rng = np.random.default_rng(seed)
+    sample_size = sample_size or n_clusters * 256
+    if len(vectors) > sample_size:
+        vectors = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+    vectors = np.asarray(vectors, dtype=np.float32)
+
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignment = assign_to_centroids(vectors, centroids, block)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        empty = np.bincount(assignment, minlength=n_clusters) == 0
+        sums[empty] = centroids[empty]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+def assign_to_centroids(vectors, centroids, block=8192):
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block):
+        assignment[start:start + block] = np.argmax(vectors[start:start + block] @ centroids.T, axis=1)
+    return assignment
+
+
+# Persistent inverted-file (IVF) index over unit-normalized embeddings, NumPy only.
+# Vectors are appended to a raw float32 file and partitioned into lists around
+# k-means centroids; a query scans only its n_probe closest lists, so search cost
+# grows with N / n_lists instead of N. Until enough vectors exist to train the
+# centroids the index falls back to an exact scan.
+class IVFIndex:
+    def __init__(self, index_dir, n_lists=256, n_probe=8, min_train_size=2048):
+        self.index_dir = index_dir
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.min_train_size = min_train_size
+        self.dim = None
+        self.trained_size = 0
+        self.files = {}
+        self.centroids = None
+        self.list_ids = np.zeros(0, dtype=np.int32)
+        self.metadata = []
+        self.langs = np.zeros(0, dtype=object)
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self._lists = {}
+
+        os.makedirs(index_dir, exist_ok=True)
+        index_path = self._path(INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            self.dim = index["dim"]
+            self.trained_size = index["trained_size"]
+            self.files = index["files"]
+            if os.path.exists(self._path(METADATA_FILE)):
+                with open(self._path(METADATA_FILE), "r", encoding="utf-8") as f:
+                    self.metadata = [json.loads(line) for line in f]
+                self.list_ids = np.fromfile(self._path(LISTS_FILE), dtype=np.int32)[:len(self.metadata)]
+            self.langs = np.array([entry.get("lang") for entry in self.metadata], dtype=object)
+            if os.path.exists(self._path(CENTROIDS_FILE)):
+                self.centroids = np.load(self._path(CENTROIDS_FILE))
+            self._load_vectors()
+            self._build_lists()
+
+    def _path(self, name):
+        return os.path.join(self.index_dir, name)
+
+    def __len__(self):
+        return len(self.metadata)
+
+    def _load_vectors(self):
+        path = self._path(VECTORS_FILE)
+        if self.dim is None or not os.path.exists(path):
+            return
+        self.vectors = np.memmap(path, dtype=np.float32, mode="r").reshape(-1, self.dim)[:len(self.metadata)]
+
+    # Inverted lists: centroid id -> ids of the vectors assigned to it
+    def _build_lists(self):
+        self._lists = {}
+        if self.centroids is None:
+            return
+        order = np.argsort(self.list_ids, kind="stable")
+        bounds = np.searchsorted(self.list_ids[order], np.arange(len(self.centroids) + 1))
+        for c in range(len(self.centroids)):
+            if bounds[c + 1] > bounds[c]:
+                self._lists[c] = order[bounds[c]:bounds[c + 1]]
+
+    def _train(self):
+        n_lists = max(1, min(self.n_lists, int(np.sqrt(len(self)))))
+        self.centroids = spherical_kmeans(self.vectors, n_lists)
+        self.list_ids = assign_to_centroids(self.vectors, self.centroids)
+        self.trained_size = len(self)
+        np.save(self._path(CENTROIDS_FILE), self.centroids)
+        self.list_ids.tofile(self._path(LISTS_FILE))
+        self._build_lists()
+
+    # Append vectors with one metadata dict each (e.g. lang, file, line, text)
+    def add(self, vectors, metadata):
+        vectors = normalize_rows(vectors)
+        if len(vectors) != len(metadata):
+            raise ValueError("Each vector needs exactly one metadata entry")
+        if len(vectors) == 0:
+            return
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Vector dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+
+        with open(self._path(VECTORS_FILE), "ab") as f:
+            f.write(vectors.tobytes())
+        with open(self._path(METADATA_FILE), "a", encoding="utf-8") as f:
+            for entry in metadata:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.metadata.extend(metadata)
+        self.langs = np.concatenate([self.langs, np.array([entry.get("lang") for entry in metadata], dtype=object)])
+        self._load_vectors()
+
+        if self.centroids is None:
+            new_ids = np.full(len(vectors), -1, dtype=np.int32)
+        else:
+            new_ids = assign_to_centroids(vectors, self.centroids)
+        self.list_ids = np.concatenate([self.list_ids, new_ids])
+        with open(self._path(LISTS_FILE), "ab") as f:
+            f.write(new_ids.tobytes())
+
+        untrained = self.centroids is None and len(self) >= self.min_train_size
+        if untrained or (self.trained_size and len(self) >= RETRAIN_GROWTH * self.trained_size):
+            self._train()
+        elif self.centroids is not None:
+            self._build_lists()
+        self.save()
+
+    # Index every paragraph of a JSONL file once; returns False if it was already indexed unchanged
+    def add_jsonl_file(self, path, lang, sentences, encode_fn):
+        content_hash = file_sha256(path)
+        if self.files.get(path) == content_hash:
+            return False
+        if path in self.files:
+            print(f"⚠️ {path} changed since it was indexed; its old paragraphs stay in the index")
+
+        if sentences:
+            self.add(encode_fn(sentences), [
+                {"lang": lang, "file": path, "paragraph": i, "text": text}
+                for i, text in enumerate(sentences)
+            ])
+        self.files[path] = content_hash
+        self.save()
+        return True
+
+    def save(self):
+        index = {"dim": self.dim, "trained_size": self.trained_size, "files": self.files}
+        tmp_path = self._path(INDEX_FILE) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(INDEX_FILE))
+
+    def _candidates(self, query):
+        if self.centroids is None:
+            return np.arange(len(self))
+        probe = np.argsort(-(self.centroids @ query))[:self.n_probe]
+        lists = [self._lists[c] for c in probe if c in self._lists]
+        return np.concatenate(lists) if lists else np.zeros(0, dtype=np.int64)
+
+    # Top-k (metadata, score) per query, optionally restricted to one language
+    def search(self, queries, k=5, lang=None):
+        queries = normalize_rows(queries)
+        results = []
+        for query in queries:
+            ids = self._candidates(query)
+            if lang is not None and len(ids):
+                ids = ids[self.langs[ids] == lang]
+            if not len(ids):
+                results.append([])
+                continue
+
+            scores = self.vectors[ids] @ query
+            top = np.argsort(-scores, kind="stable")[:k]
+            results.append([(self.metadata[ids[i]], float(scores[i])) for i in top])
+        return results
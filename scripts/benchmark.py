@@ -0,0 +1,407 @@
+import os
+import io
+import re
+import sys
+import json
+import time
+import zlib
+import random
+import shutil
+import argparse
+import tempfile
+import resource
+import threading
+import numpy as np
+
+from alignment_engine import align_triplets, tiled_top_k
+from embedding_cache import EmbeddingCache, encode_cached
+from fake_documentai import fake_ocr_text, start_fake_processor, make_rest_processor
+from jsonl_repair import JsonlRepairer
+from metrics import metrics
+from ocr_executor import ConcurrentOCRExecutor
+from pdf_chunker import get_pdf_into_chunks
+from sharded_extraction import ShardedExtractor
+from stub_gemini import StubGeminiModel
+from text_layer import plan_page_segments
+
+WORDS = (
+    "court appeal judgment section act petitioner respondent order law provision "
+    "state minister rights held evidence application writ contract land property "
+    "decision constitution parliament gazette notice clause amendment authority"
+).split()
+TAMIL_LETTERS = [chr(c) for c in range(0x0B95, 0x0BB9)]
+SINHALA_LETTERS = [chr(c) for c in range(0x0D9A, 0x0DC6)]
+PAGE_MARKER = re.compile(r"Page (\d+) of")
+
+
+def synthetic_sentence(rng, n_words):
+    return " ".join(rng.choice(WORDS) for _ in range(n_words)).capitalize() + "."
+
+
+def synthetic_script_sentence(rng, letters, n_words):
+    return " ".join("".join(rng.choice(letters) for _ in range(rng.randint(2, 7))) for _ in range(n_words)) + "."
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+# Minimal hand-written PDF: Helvetica text pages, plus image-only "scanned" pages
+# carrying an incompressible grayscale image so they are as large as real scans
+def make_pdf(page_lines, image_pages=(), image_side=600, seed=0):
+    rng = random.Random(seed)
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_refs = []
+
+    for page_index, lines in enumerate(page_lines):
+        content = []
+        resources = "/Font << /F1 3 0 R >>"
+
+        if page_index not in image_pages:
+            content.append("BT /F1 11 Tf 14 TL 56 780 Td")
+            content += [f"({_pdf_escape(line)}) Tj T*" for line in lines]
+            content.append("ET")
+        else:
+            pixels = bytes(rng.getrandbits(8) for _ in range(image_side * image_side))
+            objects.append(
+                f"<< /Type /XObject /Subtype /Image /Width {image_side} /Height {image_side} "
+                f"/ColorSpace /DeviceGray /BitsPerComponent 8 /Length {len(pixels)} >>\nstream\n".encode()
+                + pixels + b"\nendstream"
+            )
+            resources += f" /XObject << /Im1 {len(objects)} 0 R >>"
+            content.append("q 480 0 0 480 56 120 cm /Im1 Do Q")
+
+        stream = "\n".join(content).encode("latin-1")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << {resources} >> /Contents {content_ref} 0 R >>".encode()
+        )
+        page_refs.append(len(objects))
+
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    kids = " ".join(f"{ref} 0 R" for ref in page_refs)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_refs)} >>".encode()
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def generate_pdfs(directory, num_pdfs, pages, image_ratio, seed):
+    rng = random.Random(seed)
+    paths = []
+    for doc in range(num_pdfs):
+        page_lines = [
+            [f"Page {page + 1} of document {doc}"] + [synthetic_sentence(rng, 12) for _ in range(20)]
+            for page in range(pages)
+        ]
+        image_pages = {page for page in range(pages) if rng.random() < image_ratio}
+        path = os.path.join(directory, f"synthetic_{doc:03d}.pdf")
+        with open(path, "wb") as f:
+            f.write(make_pdf(page_lines, image_pages, seed=seed + doc))
+        paths.append(path)
+    return paths
+
+
+def generate_corpus(num_paragraphs, seed):
+    rng = random.Random(seed)
+    english = [synthetic_sentence(rng, rng.randint(5, 120)) for _ in range(num_paragraphs)]
+    tamil = [synthetic_script_sentence(rng, TAMIL_LETTERS, rng.randint(5, 120)) for _ in range(num_paragraphs)]
+    sinhala = [synthetic_script_sentence(rng, SINHALA_LETTERS, rng.randint(5, 120)) for _ in range(num_paragraphs)]
+    return english, tamil, sinhala
+
+
+# LLM-style JSONL with the failure modes the cleaner handles
+def messy_jsonl_lines(paragraphs, seed):
+    rng = random.Random(seed)
+    lines = ["```jsonl\n"]
+    i = 0
+    while i < len(paragraphs):
+        roll = rng.random()
+        obj = json.dumps({"paragraph": paragraphs[i]}, ensure_ascii=False)
+        if roll < 0.1 and i + 1 < len(paragraphs):
+            lines.append(obj + json.dumps({"paragraph": paragraphs[i + 1]}, ensure_ascii=False) + "\n")
+            i += 2
+            continue
+        if roll < 0.2:
+            lines.append('{\n  "paragraph": ' + json.dumps(paragraphs[i].replace(" ", "\\n", 1), ensure_ascii=False) + "\n}\n")
+        elif roll < 0.25:
+            lines.append("Here is the next paragraph:\n")
+            lines.append(obj + "\n")
+        else:
+            lines.append(obj + "\n")
+        i += 1
+    lines.append("```\n")
+    return lines
+
+
+# Deterministic stand-in for a sentence encoder: hashed bag of words into a fixed
+# random table, plus injected latency per batch
+class HashingEncoder:
+    def __init__(self, dim=384, buckets=4096, latency_per_batch=0.0, batch_size=64, seed=0):
+        self.table = np.random.default_rng(seed).standard_normal((buckets, dim)).astype(np.float32)
+        self.buckets = buckets
+        self.latency_per_batch = latency_per_batch
+        self.batch_size = batch_size
+
+    def encode(self, texts):
+        out = np.zeros((len(texts), self.table.shape[1]), dtype=np.float32)
+        for i, text in enumerate(texts):
+            ids = [zlib.crc32(token.encode("utf-8")) % self.buckets for token in text.split()]
+            if ids:
+                out[i] = self.table[ids].sum(axis=0)
+        if self.latency_per_batch:
+            time.sleep(self.latency_per_batch * -(-len(texts) // self.batch_size))
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-8)
+
+
+def correlated_embeddings(n, dim, noise, seed):
+    rng = np.random.default_rng(seed)
+    base = rng.standard_normal((n, dim)).astype(np.float32)
+    others = [base[rng.permutation(n)] + noise * rng.standard_normal((n, dim)).astype(np.float32) for _ in range(2)]
+    return base, others[0], others[1]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# Current resident set size; None where /proc is not available
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+
+# Samples the resident set size in a background thread while one stage runs.
+# ru_maxrss is the peak of the whole process, which every stage after the largest
+# one would report; the sampled peak minus the RSS at the start belongs to the stage.
+class RssSampler:
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start = None
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start = self.peak = current_rss_mb()
+        if self.start is not None:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss_mb())
+
+    def __exit__(self, *exc):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self.peak = max(self.peak, current_rss_mb())
+        return False
+
+    def delta_mb(self):
+        return None if self.start is None else round(self.peak - self.start, 1)
+
+
+def measure(report, name, fn, units, unit_name):
+    with RssSampler() as rss:
+        start = time.perf_counter()
+        extra = fn() or {}
+        elapsed = time.perf_counter() - start
+    report["stages"][name] = {
+        "wall_time_s": round(elapsed, 4),
+        unit_name: units,
+        f"{unit_name}_per_s": round(units / elapsed, 2) if elapsed > 0 else None,
+        "rss_start_mb": None if rss.start is None else round(rss.start, 1),
+        "peak_rss_delta_mb": rss.delta_mb(),
+        **extra,
+    }
+    print(f"{name:>16}: {elapsed:8.3f}s  {units / elapsed if elapsed else 0:10.1f} {unit_name}/s", file=sys.stderr)
+
+
+def bench_chunker(pdf_paths, chunk_size, max_chunk_bytes):
+    chunk_bytes = []
+    for path in pdf_paths:
+        for chunk in get_pdf_into_chunks(path, chunk_size, max_chunk_bytes):
+            chunk_bytes.append(chunk.getbuffer().nbytes)
+    return {"chunks": len(chunk_bytes), "max_chunk_bytes": max(chunk_bytes, default=0)}
+
+
+def bench_text_layer(pdf_paths):
+    local = remote = 0
+    for path in pdf_paths:
+        for kind, first, last, _ in plan_page_segments(path):
+            if kind == "local":
+                local += last - first + 1
+            else:
+                remote += last - first + 1
+    return {"local_pages": local, "remote_pages": remote}
+
+
+# What the fake processor returns for every chunk of every PDF, computed locally
+def expected_ocr_texts(pdf_paths, chunk_size, max_chunk_bytes):
+    return {
+        path: [fake_ocr_text(chunk.getvalue()) for chunk in get_pdf_into_chunks(path, chunk_size, max_chunk_bytes)]
+        for path in pdf_paths
+    }
+
+
+# Quota errors are injected, so every chunk is checked against the local OCR text:
+# a chunk lost or emptied on retry fails the benchmark instead of passing as "ordered"
+def bench_documentai(pdf_paths, chunk_size, max_chunk_bytes, latency, in_flight, expected):
+    server, endpoint = start_fake_processor(latency=latency, jitter=latency / 4, quota_error_rate=0.05)
+    try:
+        executor = ConcurrentOCRExecutor(make_rest_processor(endpoint), max_in_flight=in_flight, base_delay=latency / 4)
+        ordered = True
+        missing_pages = []
+        for path in pdf_paths:
+            texts = executor.map(get_pdf_into_chunks(path, chunk_size, max_chunk_bytes))
+            pages = [int(n) for n in PAGE_MARKER.findall("\n".join(texts))]
+            expected_pages = [int(n) for n in PAGE_MARKER.findall("\n".join(expected[path]))]
+            ordered = ordered and pages == sorted(pages)
+            missing_pages += [f"{os.path.basename(path)}:{page}" for page in sorted(set(expected_pages) - set(pages))]
+            if len(texts) != len(expected[path]) or any(t != e for t, e in zip(texts, expected[path])):
+                missing_pages += [f"{os.path.basename(path)}: chunk text differs"]
+    finally:
+        server.shutdown()
+    if missing_pages:
+        raise RuntimeError(f"Document AI benchmark lost OCR text: {', '.join(missing_pages[:20])}")
+    return {"ordered": ordered, "complete": True}
+
+
+def bench_gemini(pdf_paths, pages, latency, shard_size, concurrency):
+    model = StubGeminiModel(latency=latency, jitter=latency / 4)
+    extractor = ShardedExtractor(model.generate, lambda first, last: f"pages {first}-{last}",
+                                 shard_size=shard_size, concurrency=concurrency)
+    texts = extractor.run((path, 1, pages) for path in pdf_paths)
+    return {"model_calls": model.calls, "failed_pdfs": texts.count(None),
+            "jsonl_lines": sum(len(t.splitlines()) for t in texts if t is not None)}
+
+
+def bench_cleaner(lines):
+    repairer = JsonlRepairer()
+    for line in lines:
+        repairer.feed(line)
+    repairer.finish()
+    return {k: repairer.stats[k] for k in ("objects", "clean", "repaired", "dropped")}
+
+
+def bench_embedder(texts, encoder, cache_dir):
+    cache = EmbeddingCache(cache_dir, max_entries=len(texts) * 2)
+    cold_start = time.perf_counter()
+    encode_cached(cache, texts, encoder.encode, "hashing", "query: ")
+    cold = time.perf_counter() - cold_start
+    warm_start = time.perf_counter()
+    encode_cached(cache, texts, encoder.encode, "hashing", "query: ")
+    warm = time.perf_counter() - warm_start
+    return {"cold_s": round(cold, 4), "warm_s": round(warm, 4), **cache.stats()}
+
+
+def bench_e5_aligner(english, tamil, sinhala, dim, mode):
+    eng, tam, sin = correlated_embeddings(len(english), dim, 0.3, seed=1)
+    triplets = align_triplets(english, tamil, sinhala, eng, tam, sin, mode=mode)
+    return {"triplets": len(triplets), "mode": mode}
+
+
+def bench_laser_aligner(n, dim, tile_size):
+    base, other, _ = correlated_embeddings(n, dim, 0.3, seed=2)
+    tiled_top_k(base, other, k=1, tile_size=tile_size)
+    return {"tile_size": tile_size}
+
+
+STAGES = ("chunker", "text_layer", "documentai", "gemini", "cleaner", "embedder", "e5_aligner", "laser_aligner")
+
+
+def run_benchmarks(args):
+    report = {"config": vars(args).copy(), "stages": {}}
+    work_dir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        pdf_paths = generate_pdfs(work_dir, args.pdfs, args.pages, args.image_ratio, args.seed)
+        english, tamil, sinhala = generate_corpus(args.paragraphs, args.seed)
+        total_pages = args.pdfs * args.pages
+        selected = set(args.stages)
+
+        if "chunker" in selected:
+            measure(report, "chunker", lambda: bench_chunker(pdf_paths, args.chunk_size, args.max_chunk_bytes),
+                    total_pages, "pages")
+        if "text_layer" in selected:
+            measure(report, "text_layer", lambda: bench_text_layer(pdf_paths), total_pages, "pages")
+        if "documentai" in selected:
+            expected = expected_ocr_texts(pdf_paths, args.chunk_size, args.max_chunk_bytes)
+            measure(report, "documentai", lambda: bench_documentai(
+                pdf_paths, args.chunk_size, args.max_chunk_bytes, args.latency, args.in_flight, expected),
+                total_pages, "pages")
+        if "gemini" in selected:
+            measure(report, "gemini", lambda: bench_gemini(
+                pdf_paths, args.pages, args.latency, args.shard_size, args.in_flight), total_pages, "pages")
+        if "cleaner" in selected:
+            lines = messy_jsonl_lines(english, args.seed)
+            measure(report, "cleaner", lambda: bench_cleaner(lines), len(english), "paragraphs")
+        if "embedder" in selected:
+            texts = english + tamil + sinhala
+            encoder = HashingEncoder(dim=args.dim, latency_per_batch=args.encode_latency)
+            measure(report, "embedder", lambda: bench_embedder(texts, encoder, os.path.join(work_dir, "cache")),
+                    len(texts), "paragraphs")
+        if "e5_aligner" in selected:
+            measure(report, "e5_aligner", lambda: bench_e5_aligner(english, tamil, sinhala, args.dim, args.align_mode),
+                    len(english), "paragraphs")
+        if "laser_aligner" in selected:
+            measure(report, "laser_aligner", lambda: bench_laser_aligner(len(english), args.dim, args.tile_size),
+                    len(english), "paragraphs")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    report["metrics"] = metrics.snapshot()
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline throughput benchmark with synthetic data and fake remote services.")
+    parser.add_argument("--pdfs", type=int, default=4, help="Number of synthetic PDFs")
+    parser.add_argument("--pages", type=int, default=30, help="Pages per synthetic PDF")
+    parser.add_argument("--image-ratio", type=float, default=0.25, help="Share of pages carrying a scan-sized image")
+    parser.add_argument("--paragraphs", type=int, default=2000, help="Paragraphs per language in the JSONL corpus")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension of the stand-in encoder")
+    parser.add_argument("--latency", type=float, default=0.05, help="Injected latency of the fake Document AI / Gemini calls (s)")
+    parser.add_argument("--encode-latency", type=float, default=0.0, help="Injected encoder latency per batch of 64 (s)")
+    parser.add_argument("--in-flight", type=int, default=4, help="Concurrent remote requests")
+    parser.add_argument("--chunk-size", type=int, default=15)
+    parser.add_argument("--max-chunk-bytes", type=int, default=2 * 1024 * 1024)
+    parser.add_argument("--shard-size", type=int, default=10)
+    parser.add_argument("--tile-size", type=int, default=1024)
+    parser.add_argument("--align-mode", default="global_greedy")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run_benchmarks(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
@@ -0,0 +1,129 @@
+import json
+import time
+import argparse
+
+import numpy as np
+
+from alignment_engine import normalize_rows
+from quantization import STORAGE_DTYPES, quantize, quantized_similarity
+
+
+# Rough subword count when no tokenizer is at hand: XLM-R style vocabularies split
+# Tamil and Sinhala words into more pieces than English ones, hence the character term
+def approx_token_counts(texts):
+    return [2 + max(len(text.split()), len(text) // 4) for text in texts]
+
+
+# Group text indices into batches of similar length. Texts are sorted by token
+# count and a batch grows while (texts in batch) x (longest text) stays under
+# token_budget, so short paragraphs go in large batches and long ones in small
+# batches, with little padding in either.
+def plan_length_batches(lengths, token_budget=16384, max_batch=256):
+    order = np.argsort(np.asarray(lengths), kind="stable")
+    batches, batch, longest = [], [], 0
+    for i in order:
+        length = max(1, int(lengths[i]))
+        if batch and (len(batch) >= max_batch or (len(batch) + 1) * max(longest, length) > token_budget):
+            batches.append(batch)
+            batch, longest = [], 0
+        batch.append(int(i))
+        longest = max(longest, length)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+# Encode texts in length-bucketed batches and return the vectors in input order.
+# count_tokens(texts) -> list of token counts; encode_fn(texts) -> array.
+def encode_bucketed(texts, encode_fn, token_budget=16384, max_batch=256, count_tokens=approx_token_counts):
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    out = None
+    for batch in plan_length_batches(count_tokens(texts), token_budget, max_batch):
+        vectors = np.asarray(encode_fn([texts[i] for i in batch]), dtype=np.float32)
+        if out is None:
+            out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+        out[batch] = vectors
+    return out
+
+
+# Time the current single-call path against the bucketed path and measure how far
+# bucketing and each storage format move the cosine similarities
+def compare_encoding_paths(texts, baseline_fn, bucketed_fn, storages=("float16", "int8")):
+    start = time.perf_counter()
+    baseline = normalize_rows(baseline_fn(texts))
+    baseline_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bucketed = normalize_rows(bucketed_fn(texts))
+    bucketed_seconds = time.perf_counter() - start
+
+    self_cos = np.sum(baseline * bucketed, axis=1)
+    reference = baseline @ baseline.T
+    report = {
+        "texts": len(texts),
+        "baseline_seconds": round(baseline_seconds, 3),
+        "bucketed_seconds": round(bucketed_seconds, 3),
+        "speedup": round(baseline_seconds / bucketed_seconds, 2) if bucketed_seconds > 0 else None,
+        "bucketing_drift": {
+            "max": float(np.max(1.0 - self_cos)),
+            "mean": float(np.mean(1.0 - self_cos)),
+            "max_similarity_change": float(np.max(np.abs(bucketed @ bucketed.T - reference))),
+        },
+        "storage": {},
+    }
+    for storage in storages:
+        q, scales = quantize(baseline, storage)
+        drift = np.abs(quantized_similarity(q, scales, q, scales) - reference)
+        report["storage"][storage] = {
+            "bytes_per_vector": q.shape[1] * np.dtype(STORAGE_DTYPES[storage]).itemsize + (4 if scales is not None else 0),
+            "max_similarity_change": float(drift.max()),
+            "mean_similarity_change": float(drift.mean()),
+        }
+    return report
+
+
+def load_texts(paths, limit):
+    texts = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    texts.append(entry.get("paragraph") or entry.get("text") or "")
+    return [t for t in texts if t][:limit]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare length-bucketed e5 encoding and quantized storage with the current path.")
+    parser.add_argument("jsonl_files", nargs="+", help="Cleaned JSONL files to take paragraphs from")
+    parser.add_argument("--limit", type=int, default=2000)
+    parser.add_argument("--token-budget", type=int, default=16384)
+    parser.add_argument("--max-batch", type=int, default=256)
+    parser.add_argument("--prefix", default="query: ")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    from sentence_transformers import SentenceTransformer
+    from embedding_server import E5_MODEL_NAME
+
+    args = parse_args()
+    texts = load_texts(args.jsonl_files, args.limit)
+    model = SentenceTransformer(E5_MODEL_NAME)
+    prefixed = [f"{args.prefix}{t}" for t in texts]
+
+    def baseline(items):
+        return model.encode(items, convert_to_numpy=True, normalize_embeddings=True)
+
+    def count_tokens(items):
+        return [len(ids) for ids in model.tokenizer(items, truncation=True, max_length=model.max_seq_length)["input_ids"]]
+
+    def bucketed(items):
+        return encode_bucketed(
+            items, lambda batch: model.encode(batch, batch_size=len(batch), convert_to_numpy=True, normalize_embeddings=True),
+            args.token_budget, args.max_batch, count_tokens,
+        )
+
+    print(json.dumps(compare_encoding_paths(prefixed, baseline, bucketed), indent=2))
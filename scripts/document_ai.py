@@ -1,15 +1,23 @@
 import os
 from google.api_core.client_options import ClientOptions
-import google
 import json
 import requests
 import math
-from PyPDF2 import PdfReader, PdfWriter
 import io
 import re
+import threading
+from typing import Optional
 
 from google.cloud import documentai_v1 as documentai
 
+from ocr_executor import ConcurrentOCRExecutor
+from metrics import metrics, export_metrics, profile_stage
+from pdf_chunker import MAX_CHUNK_BYTES, get_pdf_into_chunks, get_pdf_page_count
+from text_layer import plan_page_segments
+from manifest import ProcessingManifest
+from response_cache import file_sha256, sha256_text
+from text_normalize import normalize_document
+
 api_json = "paralegal-459016-b0fa7a68be47.json"
 
 project_json_path = "project_credential.json"
@@ -17,29 +25,41 @@ with open(project_json_path) as file:
     project_data = json.load(file)
 
 
-def get_google_documentai(
-    pdf_chunk: io.BytesIO
-) -> google.cloud.documentai_v1.types.document_processor_service.ProcessResponse:
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = api_json
+# Document AI client shared by every chunk request (created once, thread-safe)
+_docai_client = None
+_docai_client_lock = threading.Lock()
+
+
+def get_documentai_client() -> documentai.DocumentProcessorServiceClient:
+    global _docai_client
+
+    with _docai_client_lock:
+        if _docai_client is None:
+            os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = api_json
+            _docai_client = documentai.DocumentProcessorServiceClient(
+                client_options=ClientOptions(
+                    api_endpoint=f"{project_data['location']}-documentai.googleapis.com"
+                )
+            )
+    return _docai_client
 
-    global project_data
 
+def get_google_documentai(
+    pdf_chunk: io.BytesIO
+) -> str:
     PROJECT_ID = project_data["project_id"]
     LOCATION = project_data["location"]
     PROCESSOR_ID = project_data["processor_id"]
     MIME_TYPE = "application/pdf"
 
-    docai_client = documentai.DocumentProcessorServiceClient(
-        client_options=ClientOptions(
-            api_endpoint=f"{LOCATION}-documentai.googleapis.com"
-        )
-    )
+    docai_client = get_documentai_client()
 
     RESOURCE_NAME = docai_client.processor_path(
         PROJECT_ID, LOCATION, PROCESSOR_ID)
 
-    # Read PDF chunk content
-    chunk_content = pdf_chunk.read()
+    # Read the whole PDF chunk; getvalue() ignores the stream position, so retries resend it intact
+    chunk_content = pdf_chunk.getvalue()
+    metrics.inc("remote_bytes_sent_total", len(chunk_content), service="documentai")
 
     # with open(pdf_path, "rb") as image:
     #     image_content = image.read()
@@ -56,52 +76,67 @@ def get_google_documentai(
 
     return document_object
 
-# Function to split the PDF into chunks of a specified size (default is 15 pages)
-
-
-def get_pdf_into_chunks(pdf_path: str, chunk_size: int = 15) -> list:
-    pdf_bucket = []
-
-    # Open the PDF file
-    with open(pdf_path, "rb") as pdf_file:
-        pdf_reader = PdfReader(pdf_file)
-        total_page_num = len(pdf_reader.pages)
+# Stage name of Document AI OCR in the processing manifest
+OCR_STAGE = "documentai_ocr"
 
-        # Loop through the PDF in chunks of chunk_size
-        for start_page in range(0, total_page_num, chunk_size):
-            end_page = min(start_page + chunk_size, total_page_num)
-            print(f"Processing pages {start_page + 1} to {end_page}...")
-
-            pdf_writer = PdfWriter()
-
-            # Write the pages in the range to a new PDF chunk
-            for page_num in range(start_page, end_page):
-                pdf_writer.add_page(pdf_reader.pages[page_num])
-
-            # Save the chunk in a BytesIO stream
-            chunk_stream = io.BytesIO()
-            pdf_writer.write(chunk_stream)
-            chunk_stream.seek(0)
-            pdf_bucket.append(chunk_stream)
+# Main function to process the entire PDF and return the concatenated text
 
-    return pdf_bucket
 
-# Main function to process the entire PDF and return the concatenated text
+def process_large_pdf(
+    pdf_path: str, chunk_size: int = 15, max_in_flight: int = 4, max_chunk_bytes: int = MAX_CHUNK_BYTES,
+    local_fast_path: bool = True, expected_script: Optional[str] = None,
+    manifest: Optional[ProcessingManifest] = None, job_hash: Optional[str] = None
+) -> str:
+    # Pages with a usable embedded text layer are read locally; only scanned pages
+    # and pages with a broken text layer go to Document AI
+    if local_fast_path:
+        segments = plan_page_segments(pdf_path, expected_script=expected_script)
+    else:
+        segments = [("remote", 1, get_pdf_page_count(pdf_path), None)]
+
+    remote_runs = [(first, last) for kind, first, last, _ in segments if kind == "remote"]
+    remote_pages = sum(last - first + 1 for first, last in remote_runs)
+    local_pages = sum(last - first + 1 for kind, first, last, _ in segments if kind == "local")
+    metrics.inc("remote_pages_total", remote_pages, service="documentai")
+    metrics.inc("local_pages_total", local_pages, service="documentai")
+    print(f"{remote_pages} page(s) need OCR")
+
+    # Split the remote pages into chunks lazily; at most max_in_flight chunks are materialized at once
+    def tagged_chunks():
+        chunk_index = 0
+        for run_index, (first, last) in enumerate(remote_runs):
+            for chunk in get_pdf_into_chunks(pdf_path, chunk_size, max_chunk_bytes, pages=range(first - 1, last)):
+                yield run_index, chunk_index, chunk
+                chunk_index += 1
+
+    # Chunks finished by an earlier, interrupted run are taken from the manifest
+    def ocr_chunk(item):
+        run_index, chunk_index, chunk = item
+        if manifest is not None:
+            chunk_text = manifest.chunk_result(OCR_STAGE, pdf_path, job_hash, chunk_index)
+            if chunk_text is not None:
+                return run_index, chunk_text
 
+        chunk_text = get_google_documentai(chunk)
+        if manifest is not None:
+            manifest.save_chunk(OCR_STAGE, pdf_path, job_hash, chunk_index, chunk_text)
+        return run_index, chunk_text
 
-def process_large_pdf(pdf_path: str, chunk_size: int = 15) -> str:
-    # Split the PDF into chunks
-    pdf_chunks = get_pdf_into_chunks(pdf_path, chunk_size)
+    # OCR the chunks concurrently; texts come back in page order
+    executor = ConcurrentOCRExecutor(ocr_chunk, max_in_flight=max_in_flight)
+    run_texts = [[] for _ in remote_runs]
+    for run_index, chunk_text in executor.map(tagged_chunks()):
+        run_texts[run_index].append(chunk_text)
 
+    # Merge local page text and OCR text in page order
     all_text = []
+    remote_texts = iter(run_texts)
+    for kind, _, _, page_texts in segments:
+        all_text.extend(page_texts if kind == "local" else next(remote_texts))
 
-    # Process each chunk and collect the text
-    for chunk in pdf_chunks:
-        chunk_text = get_google_documentai(chunk)
-        all_text.append(chunk_text)
+    # Concatenate all the text from all chunks, normalized line by line
+    return normalize_document("\n".join(all_text))
 
-    # Concatenate all the text from all chunks
-    return "\n".join(all_text)
 
 # Function to save text to a JSON file
 
@@ -117,9 +152,28 @@ def save_text_to_json(text: str, output_file: str):
 # Function to process all PDFs in a directory and save results
 
 
-def process_pdfs_in_directory(directory_path: str):
+# Identifies one OCR job: the PDF bytes plus the settings that decide its chunk boundaries
+def ocr_job_hash(pdf_path: str, chunk_size: int, max_chunk_bytes: int, local_fast_path: bool,
+                 expected_script: Optional[str] = None) -> str:
+    settings = f"{file_sha256(pdf_path)}:{chunk_size}:{max_chunk_bytes}:{local_fast_path}"
+    if expected_script is not None:
+        settings += f":{expected_script}"
+    return sha256_text(settings)
+
+
+# Function to process all PDFs in a directory and save results. Progress is kept in a
+# manifest next to the outputs: unchanged completed PDFs are skipped and interrupted
+# or failed ones resume from their last finished chunk. expected_script ("en", "ta",
+# "si") is the language of the folder's documents; it lets the local fast path reject
+# legacy-font Tamil/Sinhala text layers when the file names carry no "-e/-t/-s" hint.
+def process_pdfs_in_directory(
+    directory_path: str, chunk_size: int = 15, max_chunk_bytes: int = MAX_CHUNK_BYTES,
+    local_fast_path: bool = True, manifest: Optional[ProcessingManifest] = None,
+    expected_script: Optional[str] = None
+):
+    manifest = manifest or ProcessingManifest.for_directory(directory_path)
     success_count = 0
-    failed_pdfs = []
+    skipped_count = 0
 
     for root, _, files in os.walk(directory_path):
         for file in files:
@@ -127,21 +181,29 @@ def process_pdfs_in_directory(directory_path: str):
                 pdf_path = os.path.join(root, file)
                 output_json_path = pdf_path.replace(".pdf", ".json")
 
+                job_hash = ocr_job_hash(pdf_path, chunk_size, max_chunk_bytes, local_fast_path, expected_script)
+                if manifest.is_complete(OCR_STAGE, pdf_path, job_hash) and os.path.exists(output_json_path):
+                    skipped_count += 1
+                    continue
+
                 print(f"Processing PDF: {file}")
+                manifest.start(OCR_STAGE, pdf_path, job_hash)
 
                 try:
-                    document_text = process_large_pdf(pdf_path)
+                    document_text = process_large_pdf(
+                        pdf_path, chunk_size=chunk_size, max_chunk_bytes=max_chunk_bytes,
+                        local_fast_path=local_fast_path, expected_script=expected_script,
+                        manifest=manifest, job_hash=job_hash
+                    )
                     save_text_to_json(document_text, output_json_path)
+                    manifest.complete(OCR_STAGE, pdf_path)
                     success_count += 1
                 except Exception as e:
                     print(f"Error processing {file}: {str(e)}")
-                    failed_pdfs.append(file)
+                    manifest.fail(OCR_STAGE, pdf_path, e)
 
-    print(f"\nTotal PDFs successfully processed: {success_count}")
-    if failed_pdfs:
-        print(f"PDFs that failed to process: {', '.join(failed_pdfs)}")
-    else:
-        print("All PDFs processed successfully!")
+    print(f"\nTotal PDFs successfully processed: {success_count} (skipped {skipped_count} unchanged)")
+    manifest.print_summary(OCR_STAGE)
 
 # pdf_path = "pdfs\\2003\\045-SLLR-SLLR-2003-V-3-PATHMANAYAKY-v.-MAHENTHIRAN.pdf"
 # output_json_path = "pdfs\\2003\\045-SLLR-SLLR-2003-V-3-PATHMANAYAKY-v.-MAHENTHIRAN.json"
@@ -149,5 +211,8 @@ def process_pdfs_in_directory(directory_path: str):
 # document_text = process_large_pdf(pdf_path)
 # save_text_to_json(document_text, output_json_path)
 
-directory_path = "documents/Sinhala documents"
-process_pdfs_in_directory(directory_path)
+if __name__ == "__main__":
+    directory_path = "documents/Sinhala documents"
+    with profile_stage("documentai_ocr"):
+        process_pdfs_in_directory(directory_path, expected_script="si")
+    export_metrics()
@@ -0,0 +1,212 @@
+import os
+import json
+import heapq
+import hashlib
+import threading
+import numpy as np
+
+from metrics import metrics
+from quantization import STORAGE_DTYPES, check_storage, dequantize, quantize
+from text_normalize import normalize_text
+
+INDEX_FILE = "index.json"
+VECTORS_FILES = {"float32": "vectors.f32", "float16": "vectors.f16", "int8": "vectors.i8"}
+SCALES_FILE = "scales.f32"
+
+
+# Content address of one embedding: (model name, prefix, normalized text)
+def embedding_key(model_name, prefix, text):
+    payload = f"{model_name}\x1f{prefix}\x1f{normalize_text(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# On-disk embedding store: vectors live in a memory-mapped array and an index file
+# maps each key to its slot and last-use tick for LRU eviction. storage picks
+# float32, float16 or int8 with a per-vector scale (see quantization.py); None keeps
+# what an existing cache was created with, float32 for a new one. Vectors always
+# come back from get() as float32.
+class EmbeddingCache:
+    def __init__(self, cache_dir, max_entries=200_000, storage=None):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.index_path = os.path.join(cache_dir, INDEX_FILE)
+        self.scales_path = os.path.join(cache_dir, SCALES_FILE)
+        self.dim = None
+        self.clock = 0
+        self.entries = {}
+        self._free = None
+        self.vectors = None
+        self.scales = None
+        self.hits = 0
+        self.misses = 0
+        # Guards the index and vectors when several threads encode through one cache
+        self.lock = threading.RLock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            stored = index.get("storage", "float32")
+            self._set_storage(storage or stored)
+            self.dim = index["dim"]
+            self.clock = index["clock"]
+            self.entries = {k: tuple(v) for k, v in index["entries"].items()}
+            if self.dim is None:
+                self.entries = {}
+            elif index["capacity"] != max_entries or stored != self.storage:
+                self._rebuild(index["capacity"], stored)
+            else:
+                self._open_vectors()
+        else:
+            self._set_storage(storage or "float32")
+
+    def _set_storage(self, storage):
+        check_storage(storage)
+        self.storage = storage
+        self.vectors_path = os.path.join(self.cache_dir, VECTORS_FILES[storage])
+
+    def _open_vectors(self):
+        mode = "r+" if os.path.exists(self.vectors_path) else "w+"
+        self.vectors = np.memmap(self.vectors_path, dtype=STORAGE_DTYPES[self.storage], mode=mode,
+                                 shape=(self.max_entries, self.dim))
+        if self.storage == "int8":
+            mode = "r+" if os.path.exists(self.scales_path) else "w+"
+            self.scales = np.memmap(self.scales_path, dtype=np.float32, mode=mode, shape=(self.max_entries,))
+
+    # Carry existing vectors over when max_entries or the storage format changed between runs
+    def _rebuild(self, old_capacity, old_storage):
+        old_path = os.path.join(self.cache_dir, VECTORS_FILES[old_storage])
+        old = np.memmap(old_path, dtype=STORAGE_DTYPES[old_storage], mode="r", shape=(old_capacity, self.dim))
+        old_scales = None
+        if old_storage == "int8":
+            old_scales = np.memmap(self.scales_path, dtype=np.float32, mode="r", shape=(old_capacity,))
+        keep = sorted(self.entries.items(), key=lambda item: item[1][1], reverse=True)[:self.max_entries]
+        slots = [slot for _, (slot, _) in keep]
+        data = dequantize(old[slots], None if old_scales is None else old_scales[slots]).reshape(-1, self.dim)
+        del old, old_scales
+        os.remove(old_path)
+        if os.path.exists(self.scales_path):
+            os.remove(self.scales_path)
+        self._open_vectors()
+        self._write(range(len(data)), data)
+        self.entries = {key: (slot, tick) for slot, (key, (_, tick)) in enumerate(keep)}
+        self._free = None
+
+    def _write(self, slots, vectors):
+        slots = list(slots)
+        q, scales = quantize(vectors, self.storage)
+        self.vectors[slots] = q
+        if scales is not None:
+            self.scales[slots] = scales
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    # Returns a copy, so a later eviction that reuses the slot cannot change it
+    def get(self, key):
+        slot, _ = self.entries[key]
+        self.clock += 1
+        self.entries[key] = (slot, self.clock)
+        return np.array(dequantize(self.vectors[slot], None if self.scales is None else self.scales[slot]),
+                        dtype=np.float32)
+
+    # Unused slots, lowest last; built once from the index and then kept up to date
+    def _free_list(self):
+        if self._free is None:
+            used = {slot for slot, _ in self.entries.values()}
+            self._free = [slot for slot in range(self.max_entries - 1, -1, -1) if slot not in used]
+        return self._free
+
+    # Free enough slots for `count` new vectors, evicting the least recently used
+    def _free_slots(self, count):
+        free_list = self._free_list()
+        free = [free_list.pop() for _ in range(min(count, len(free_list)))]
+        if len(free) < count:
+            victims = heapq.nsmallest(count - len(free), self.entries.items(), key=lambda item: item[1][1])
+            for key, (slot, _) in victims:
+                del self.entries[key]
+                free.append(slot)
+        return free
+
+    def put_many(self, keys, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self._open_vectors()
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match cache dimension {self.dim}")
+
+        # Only the most recent max_entries vectors of an oversized batch can stay
+        keys, vectors = list(keys)[-self.max_entries:], vectors[-self.max_entries:]
+        new = [i for i, key in enumerate(keys) if key not in self.entries]
+        free = iter(self._free_slots(len(new)))
+        slots = []
+        for key in keys:
+            self.clock += 1
+            slot = self.entries[key][0] if key in self.entries else next(free)
+            self.entries[key] = (slot, self.clock)
+            slots.append(slot)
+        self._write(slots, vectors)
+
+    def save(self):
+        if self.vectors is not None:
+            self.vectors.flush()
+        if self.scales is not None:
+            self.scales.flush()
+        index = {
+            "dim": self.dim,
+            "storage": self.storage,
+            "capacity": self.max_entries,
+            "clock": self.clock,
+            "entries": self.entries,
+        }
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries), "storage": self.storage}
+
+
+# Encode texts through the cache; only texts missing from it reach encode_fn
+def encode_cached(cache, texts, encode_fn, model_name, prefix=""):
+    if cache is None:
+        with metrics.timer("encode_batch_seconds", model=model_name):
+            return np.asarray(encode_fn(list(texts)), dtype=np.float32)
+
+    keys = [embedding_key(model_name, prefix, t) for t in texts]
+    with cache.lock:
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cache and key not in missing:
+                missing[key] = text
+
+        cache.misses += len(missing)
+        cache.hits += len(keys) - len(missing)
+        metrics.inc("embedding_cache_lookups_total", len(keys) - len(missing), model=model_name, result="hit")
+        metrics.inc("embedding_cache_lookups_total", len(missing), model=model_name, result="miss")
+
+        # Copy hits out before inserting, since this batch may evict and reuse their slots
+        vectors = [cache.get(key) if key in cache else None for key in keys]
+
+    if missing:
+        with metrics.timer("encode_batch_seconds", model=model_name):
+            encoded = np.asarray(encode_fn(list(missing.values())), dtype=np.float32)
+        metrics.inc("encoded_texts_total", len(missing), model=model_name)
+        fresh = dict(zip(missing.keys(), encoded))
+        with cache.lock:
+            cache.put_many(list(missing.keys()), encoded)
+            cache.save()
+        vectors = [fresh[key] if v is None else v for key, v in zip(keys, vectors)]
+
+    if not vectors:
+        return np.zeros((0, cache.dim or 0), dtype=np.float32)
+    return np.stack(vectors)
@@ -0,0 +1,61 @@
+import os
+import time
+import logging
+import threading
+
+import numpy as np
+import requests
+
+from embedding_server import DEFAULT_HOST, DEFAULT_PORT, decode_array, load_backend
+
+logger = logging.getLogger("embedding_client")
+
+# Set EMBEDDING_SERVER_URL to point at another server, or to "off" to always encode in-process
+EMBEDDING_SERVER_URL = os.getenv("EMBEDDING_SERVER_URL", f"http://{DEFAULT_HOST}:{DEFAULT_PORT}")
+
+
+# Encodes through the warm embedding server when it is reachable and falls back to
+# loading the model in this process when it is not. After a failed connection the
+# server is not tried again for retry_interval seconds.
+class EmbeddingClient:
+    def __init__(self, url=EMBEDDING_SERVER_URL, timeout=600, retry_interval=30.0):
+        self.url = None if url in (None, "", "off") else url.rstrip("/")
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._session = requests.Session()
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+
+    def _server_available(self):
+        return self.url is not None and time.monotonic() >= self._down_until
+
+    def _encode_remote(self, model, texts, option):
+        response = self._session.post(
+            f"{self.url}/encode", json={"model": model, "option": option, "texts": list(texts)},
+            timeout=(1.0, self.timeout),
+        )
+        response.raise_for_status()
+        return decode_array(response.json()["embeddings"])
+
+    def encode(self, model, texts, option=""):
+        texts = list(texts)
+        if self._server_available():
+            try:
+                return self._encode_remote(model, texts, option)
+            except requests.ConnectionError:
+                with self._lock:
+                    if time.monotonic() >= self._down_until:
+                        logger.info(f"Embedding server at {self.url} not reachable; encoding in-process")
+                    self._down_until = time.monotonic() + self.retry_interval
+        return np.asarray(load_backend(model)(texts, option), dtype=np.float32)
+
+
+default_client = EmbeddingClient()
+
+
+def encode_e5(texts, prefix="query: "):
+    return default_client.encode("e5", texts, prefix)
+
+
+def encode_laser(texts, lang):
+    return default_client.encode("laser", texts, lang)
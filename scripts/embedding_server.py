@@ -0,0 +1,252 @@
+import os
+import base64
+import json
+import queue
+import logging
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from metrics import metrics
+
+logger = logging.getLogger("embedding_server")
+
+E5_MODEL_NAME = "intfloat/multilingual-e5-base"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Token budget per e5 batch for length-bucketed encoding (see bucketed_encoding.py);
+# 0 keeps sentence-transformers' fixed batch size of 32
+E5_TOKEN_BUDGET = int(os.getenv("E5_TOKEN_BUDGET", "0"))
+
+
+# Loaders return encode(texts, option) -> float32 array. The option is the text
+# prefix for e5 ("query: ") and the language code for LASER ("en", "ta", "si").
+def load_e5(token_budget=None):
+    from sentence_transformers import SentenceTransformer
+    from bucketed_encoding import encode_bucketed
+    model = SentenceTransformer(E5_MODEL_NAME)
+    token_budget = E5_TOKEN_BUDGET if token_budget is None else token_budget
+
+    def count_tokens(texts):
+        ids = model.tokenizer(texts, truncation=True, max_length=model.max_seq_length)["input_ids"]
+        return [len(i) for i in ids]
+
+    def encode_batch(texts):
+        return model.encode(texts, batch_size=len(texts), convert_to_numpy=True, normalize_embeddings=True)
+
+    def encode(texts, prefix):
+        texts = [f"{prefix}{t}" for t in texts]
+        if token_budget:
+            return encode_bucketed(texts, encode_batch, token_budget, count_tokens=count_tokens)
+        return model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    return encode
+
+
+def load_laser():
+    from laserembeddings import Laser
+    laser = Laser()
+
+    def encode(texts, lang):
+        return laser.embed_sentences(texts, lang=lang)
+    return encode
+
+
+LOADERS = {"e5": load_e5, "laser": load_laser}
+
+_backends = {}
+_backend_locks = {name: threading.Lock() for name in LOADERS}
+_load_lock = threading.Lock()
+
+
+# Load a model once per process; calls through the returned function are serialized
+# per model, since one model instance is shared by every batch
+def load_backend(name):
+    if name not in LOADERS:
+        raise ValueError(f"Unknown embedding model '{name}', expected one of {tuple(LOADERS)}")
+    with _load_lock:
+        if name not in _backends:
+            start = time.perf_counter()
+            raw_encode = LOADERS[name]()
+            logger.info(f"Loaded {name} in {time.perf_counter() - start:.1f}s")
+
+            def encode(texts, option, raw_encode=raw_encode, lock=_backend_locks[name]):
+                with lock, metrics.timer("encode_batch_seconds", model=name):
+                    return np.asarray(raw_encode(list(texts), option), dtype=np.float32)
+            _backends[name] = encode
+    return _backends[name]
+
+
+class _Request:
+    def __init__(self, texts):
+        self.texts = texts
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# Merges concurrent requests for one (model, option) into a single encode call.
+# The worker takes the first waiting request, then keeps adding requests until
+# max_batch texts are collected or max_wait seconds have passed.
+class DynamicBatcher:
+    def __init__(self, encode_fn, max_batch=256, max_wait=0.01):
+        self.encode_fn = encode_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        threading.Thread(target=self._work, daemon=True).start()
+
+    def submit(self, texts):
+        request = _Request(texts)
+        self.requests.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _collect(self):
+        batch = [self.requests.get()]
+        size = len(batch[0].texts)
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch, size
+
+    def _work(self):
+        while True:
+            batch, size = self._collect()
+            metrics.inc("server_batches_total")
+            metrics.inc("server_batched_texts_total", size)
+            metrics.inc("server_requests_total", len(batch))
+            try:
+                vectors = self.encode_fn([text for request in batch for text in request.texts])
+                offset = 0
+                for request in batch:
+                    request.result = vectors[offset:offset + len(request.texts)]
+                    offset += len(request.texts)
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            for request in batch:
+                request.done.set()
+
+
+def encode_array(vectors):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    return {"shape": list(vectors.shape), "data": base64.b64encode(vectors.tobytes()).decode("ascii")}
+
+
+def decode_array(payload):
+    return np.frombuffer(base64.b64decode(payload["data"]), dtype=np.float32).reshape(payload["shape"])
+
+
+class EmbeddingService:
+    def __init__(self, max_batch=256, max_wait=0.01):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batchers = {}
+        self._lock = threading.Lock()
+
+    def batcher(self, model, option):
+        key = (model, option)
+        with self._lock:
+            if key not in self.batchers:
+                encode = load_backend(model)
+                self.batchers[key] = DynamicBatcher(
+                    lambda texts: encode(texts, option), self.max_batch, self.max_wait
+                )
+            return self.batchers[key]
+
+    def encode(self, model, texts, option=""):
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self.batcher(model, option).submit(list(texts))
+
+
+# POST /encode {"model": "e5"|"laser", "option": prefix or lang, "texts": [...]}
+# -> {"embeddings": {"shape": [n, dim], "data": base64 float32}}; GET /health lists loaded models
+def make_handler(service):
+    class EmbeddingHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/health":
+                self.send_error(404)
+                return
+            self._send_json(200, {"status": "ok", "models": sorted(_backends)})
+
+        def do_POST(self):
+            if self.path != "/encode":
+                self.send_error(404)
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+                vectors = service.encode(body["model"], body.get("texts", []), body.get("option", ""))
+            except (KeyError, ValueError) as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            except Exception as e:
+                logger.error(f"Encoding failed: {e}")
+                self._send_json(500, {"error": str(e)})
+                return
+            self._send_json(200, {"embeddings": encode_array(vectors)})
+
+        def _send_json(self, status, payload):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return EmbeddingHandler
+
+
+# Start the server in a background thread; returns (server, url)
+def start_embedding_server(host=DEFAULT_HOST, port=DEFAULT_PORT, preload=(), max_batch=256, max_wait=0.01):
+    for name in preload:
+        load_backend(name)
+    server = ThreadingHTTPServer((host, port), make_handler(EmbeddingService(max_batch, max_wait)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Keep the embedding models warm behind a local HTTP endpoint.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--preload", nargs="*", choices=tuple(LOADERS), default=["e5"],
+                        help="Models to load before accepting requests")
+    parser.add_argument("--max-batch", type=int, default=256, help="Texts per merged encode call")
+    parser.add_argument("--max-wait-ms", type=float, default=10.0,
+                        help="How long a batch waits for more requests before encoding")
+    parser.add_argument("--token-budget", type=int, default=E5_TOKEN_BUDGET,
+                        help="Length-bucket e5 batches under this many padded tokens (0 disables)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    LOADERS["e5"] = lambda: load_e5(args.token_budget)
+    server, url = start_embedding_server(args.host, args.port, args.preload, args.max_batch, args.max_wait_ms / 1000)
+    print(f"Embedding server listening on {url} (models: {', '.join(sorted(_backends)) or 'loaded on demand'})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,101 @@
+import base64
+import io
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from ocr_executor import ConcurrentOCRExecutor, QuotaExceededError
+
+FAKE_RESOURCE_NAME = "projects/fake/locations/us/processors/fake"
+
+
+# Text the fake processor "recognizes": PDF pages via PyPDF2, anything else as UTF-8
+def fake_ocr_text(content):
+    if content.startswith(b"%PDF"):
+        from PyPDF2 import PdfReader
+        reader = PdfReader(io.BytesIO(content))
+        return "\n".join(page.extract_text() or "" for page in reader.pages)
+    return content.decode("utf-8", errors="replace")
+
+
+# Local stand-in for the Document AI REST endpoint
+# (POST /v1/{processor}:process with a base64 rawDocument).
+def make_handler(latency=0.2, jitter=0.1, quota_error_rate=0.0):
+    class FakeDocumentAIHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if not self.path.endswith(":process"):
+                self.send_error(404)
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+
+            if random.random() < quota_error_rate:
+                self._send_json(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}})
+                return
+
+            content = base64.b64decode(body.get("rawDocument", {}).get("content", ""))
+            self._send_json(200, {"document": {"text": fake_ocr_text(content)}})
+
+        def _send_json(self, status, payload):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeDocumentAIHandler
+
+
+# Start the fake processor in a background thread; returns (server, endpoint url)
+def start_fake_processor(port=0, latency=0.2, jitter=0.1, quota_error_rate=0.0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency, jitter, quota_error_rate))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# process_fn for ConcurrentOCRExecutor that talks to a REST endpoint (fake or real)
+def make_rest_processor(endpoint, resource_name=FAKE_RESOURCE_NAME, mime_type="application/pdf", timeout=120):
+    session = requests.Session()
+    url = f"{endpoint}/v1/{resource_name}:process"
+
+    def process(pdf_chunk):
+        content = pdf_chunk.getvalue() if hasattr(pdf_chunk, "getvalue") else pdf_chunk
+        payload = {"rawDocument": {"content": base64.b64encode(content).decode("ascii"), "mimeType": mime_type}}
+        response = session.post(url, json=payload, timeout=timeout)
+        if response.status_code == 429:
+            raise QuotaExceededError(f"Quota exceeded at {url}")
+        response.raise_for_status()
+        return response.json()["document"]["text"]
+
+    return process
+
+
+# Offline throughput and ordering check against the fake processor
+if __name__ == "__main__":
+    num_chunks = 40
+    # Half of all requests hit a quota error, so most chunks are sent more than once
+    server, endpoint = start_fake_processor(latency=0.2, quota_error_rate=0.5)
+    expected = [f"chunk {i}" for i in range(num_chunks)]
+
+    for max_in_flight in (1, 4, 8):
+        # BytesIO chunks like get_pdf_into_chunks yields, so retried requests must resend the full content
+        chunks = [io.BytesIO(text.encode("utf-8")) for text in expected]
+        executor = ConcurrentOCRExecutor(make_rest_processor(endpoint), max_in_flight=max_in_flight, max_retries=20,
+                                         base_delay=0.05, max_delay=0.5)
+        start = time.perf_counter()
+        texts = executor.map(chunks)
+        elapsed = time.perf_counter() - start
+        assert texts == expected, f"lost or reordered chunks: {[i for i, t in enumerate(texts) if t != expected[i]]}"
+        print(f"in-flight={max_in_flight}: {num_chunks / elapsed:.1f} chunks/s, all {num_chunks} chunks complete and ordered")
+
+    server.shutdown()
@@ -1,10 +1,14 @@
 import os
 import json
 import logging
-import re
 from dotenv import load_dotenv
 import google.generativeai as genai
 import PyPDF2
+from metrics import metrics, export_metrics, profile_stage
+from response_cache import ResponseCache, file_sha256, response_key, sha256_text
+from manifest import ProcessingManifest
+from sharded_extraction import ShardedExtractor, generate_for_window
+from text_layer import plan_page_segments, page_texts_to_jsonl
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -14,16 +18,13 @@ logger = logging.getLogger("pdf_extractor_batch")
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY_TRANSLEGAL")
 genai.configure(api_key=GEMINI_API_KEY)
+GEMINI_MODEL = "gemini-2.0-flash"
 
-def clean_text_content(text):
-    if isinstance(text, str):
-        text = text.strip()
-        text = re.sub(r"\s+", " ", text)
-        text = re.sub(r"\n{2,}", "\n", text)
-        text = re.sub(r"(\.){2,}", ".", text)
-        text = re.sub(r"(,){2,}", ",", text)
-        text = re.sub(r"\n\s*\n", "\n", text)
-    return text
+# Stage name of Gemini extraction in the processing manifest
+EXTRACT_STAGE = "gemini_extract"
+
+# Cached Gemini responses; GEMINI_CACHE_MODE=bypass skips the cache, refresh re-calls and overwrites it
+response_cache = ResponseCache("response_cache/gemini", mode=os.getenv("GEMINI_CACHE_MODE", "use"))
 
 def upload_to_gemini(doc_path):
     try:
@@ -42,28 +43,42 @@ def get_pdf_page_count(pdf_path):
         logger.error(f"Failed to get page count for {pdf_path}: {e}")
         return None
 
-def extract_pdf_with_ai(pdf_path, start_page, end_page):
+def build_extraction_prompt(start_page, end_page):
+    return (
+        f"The input is an image or scanned PDF page containing text in english or tamil or sinhala.\n"
+        f"Extract all text content **only from pages {start_page} to {end_page}**.\n"
+        f"Identify and segment the text into distinct paragraphs.\n"
+        f"Return the extracted content in JSON Lines (JSONL) format.\n"
+        f"Each line MUST be a valid JSON object.\n"
+        f"Do NOT include page numbers, headers, or footers.\n"
+        f"Only output JSON lines, no explanation or extra content."
+    )
+
+def gemini_generate(prompt, pdf_path):
+    status, document = upload_to_gemini(pdf_path)
+    if status != "Success":
+        raise Exception("Upload to Gemini failed.")
+
+    model = genai.GenerativeModel(GEMINI_MODEL)
+    response = model.generate_content([prompt, document])
+    return response.text
+
+# Only pages start_page..end_page are uploaded, so a PDF with several scanned runs
+# costs one small upload per run instead of one full upload per run
+def extract_pdf_with_ai(pdf_path, start_page, end_page, cache=None):
+    cache = response_cache if cache is None else cache
     try:
-        logger.info(f"Processing with Gemini AI: {os.path.basename(pdf_path)} [{start_page}-{end_page}]")
-        status, document = upload_to_gemini(pdf_path)
-        if status != "Success":
-            raise Exception("Upload to Gemini failed.")
-
-        prompt = (
-            f"The input is an image or scanned PDF page containing text in english or tamil or sinhala.\n"
-            f"Extract all text content **only from pages {start_page} to {end_page}**.\n"
-            f"Identify and segment the text into distinct paragraphs.\n"
-            f"Return the extracted content in JSON Lines (JSONL) format.\n"
-            f"Each line MUST be a valid JSON object.\n"
-            f"Do NOT include page numbers, headers, or footers.\n"
-            f"Only output JSON lines, no explanation or extra content."
-        )
-        model = genai.GenerativeModel("gemini-2.0-flash")
-        response = model.generate_content([prompt, document])
-        return response.text
+        # The uploaded file only holds the requested pages, so they are numbered from 1
+        prompt = build_extraction_prompt(1, end_page - start_page + 1)
+        key = response_key(file_sha256(pdf_path), (start_page, end_page), prompt, GEMINI_MODEL)
+
+        def generate():
+            return generate_for_window(gemini_generate, prompt, pdf_path, start_page, end_page)
+
+        return cache.get_or_call(key, generate, model=GEMINI_MODEL, source=os.path.basename(pdf_path))
     except Exception as e:
         logger.error(f"AI extraction failed for {pdf_path}: {e}")
-        return ""
+        return None
 
 def save_jsonl_string(jsonl_string, output_path):
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
@@ -71,31 +86,157 @@ def save_jsonl_string(jsonl_string, output_path):
         f.write(jsonl_string)
     logger.info(f"Saved extracted content to {output_path}")
 
-def process_pdf_folder(input_folder, output_folder, start_page=1):
+# Identifies one extraction job: the PDF bytes plus the settings that decide its page ranges
+def extraction_job_hash(pdf_path, start_page, local_fast_path, expected_script=None):
+    settings = f"{file_sha256(pdf_path)}:{start_page}:{local_fast_path}"
+    if expected_script is not None:
+        settings += f":{expected_script}"
+    return sha256_text(settings)
+
+# Check one PDF against the manifest and plan its local and remote page ranges.
+# expected_script ("en", "ta", "si") lets legacy-font Tamil/Sinhala text layers be
+# rejected; None falls back to the "-e/-t/-s" filename hint. Returns None when the PDF is skipped.
+def plan_pdf_job(pdf_path, output_path, start_page, local_fast_path, manifest, expected_script=None):
+    pdf_file = os.path.basename(pdf_path)
+    total_pages = get_pdf_page_count(pdf_path)
+    if total_pages is None:
+        logger.warning(f"Skipping {pdf_file} due to page count error.")
+        return None
+
+    if start_page > total_pages:
+        logger.warning(f"Skipping {pdf_file} because start_page ({start_page}) > total pages ({total_pages})")
+        return None
+
+    def already_extracted(job_hash):
+        if manifest.is_complete(EXTRACT_STAGE, pdf_path, job_hash) and os.path.exists(output_path):
+            logger.info(f"Skipping {pdf_file}: unchanged and already extracted.")
+            return True
+        return False
+
+    job_hash = extraction_job_hash(pdf_path, start_page, local_fast_path, expected_script)
+    if already_extracted(job_hash):
+        return None
+
+    # Born-digital pages are read from the text layer; only the rest go to Gemini.
+    # A PDF whose text layer cannot be read is extracted remotely as a whole, under the
+    # job hash of a run without the fast path so its chunks match that plan.
+    segments = None
+    if local_fast_path:
+        try:
+            segments = plan_page_segments(pdf_path, start_page, total_pages, expected_script)
+        except Exception as e:
+            logger.warning(f"Could not read the text layer of {pdf_file} ({e}); extracting all pages remotely")
+            job_hash = extraction_job_hash(pdf_path, start_page, False, expected_script)
+            if already_extracted(job_hash):
+                return None
+    if segments is None:
+        segments = [("remote", start_page, total_pages, None)]
+    manifest.start(EXTRACT_STAGE, pdf_path, job_hash)
+    return (pdf_file, pdf_path, job_hash, segments, output_path)
+
+# Extract the remote page ranges of the planned jobs. Remote page ranges are the
+# manifest chunks; ranges finished by an earlier run come from the manifest. A range
+# is only checkpointed when all of its pages were extracted; a failed range (None)
+# is left out of the manifest so the next run retries it.
+def extract_remote_ranges(jobs, manifest, extractor=None):
+    remote_results = {}
+    pending = []
+    for _, pdf_path, job_hash, segments, _ in jobs:
+        remote_ranges = [(first, last) for kind, first, last, _ in segments if kind == "remote"]
+        for chunk_index, (first, last) in enumerate(remote_ranges):
+            text = manifest.chunk_result(EXTRACT_STAGE, pdf_path, job_hash, chunk_index)
+            if text is not None:
+                remote_results[(pdf_path, chunk_index)] = text
+            else:
+                pending.append((pdf_path, job_hash, chunk_index, first, last))
+    logger.info(f"{len(pending)} page range(s) need remote extraction.")
+
+    def record_result(pending_index, text):
+        pdf_path, job_hash, chunk_index, _, _ = pending[pending_index]
+        remote_results[(pdf_path, chunk_index)] = text
+        if text is None:
+            metrics.inc("remote_range_failures_total", service="gemini")
+        elif text:
+            manifest.save_chunk(EXTRACT_STAGE, pdf_path, job_hash, chunk_index, text)
+
+    if extractor is not None:
+        extractor.run([(pdf_path, first, last) for pdf_path, _, _, first, last in pending], on_result=record_result)
+    else:
+        for i, (pdf_path, _, _, first, last) in enumerate(pending):
+            record_result(i, extract_pdf_with_ai(pdf_path, first, last))
+    return remote_results
+
+# Merge local and remote text of one job in page order, save it and update the manifest
+def write_pdf_job(job, remote_results, manifest):
+    pdf_file, pdf_path, _, segments, output_path = job
+    parts = []
+    missing = []
+    chunk_index = 0
+    for kind, first, last, page_texts in segments:
+        if kind == "local":
+            parts.append(page_texts_to_jsonl(page_texts))
+            continue
+        text = remote_results.get((pdf_path, chunk_index))
+        if not text:
+            missing.append(f"{first}-{last}")
+        else:
+            parts.append(text)
+        chunk_index += 1
+
+    extracted_text = "\n".join(part.strip() for part in parts if part and part.strip())
+    if extracted_text:
+        save_jsonl_string(extracted_text, output_path)
+    else:
+        logger.warning(f"No content extracted for {pdf_file}")
+
+    if missing:
+        manifest.fail(EXTRACT_STAGE, pdf_path, f"no content for pages {', '.join(missing)}")
+        return False
+    manifest.complete(EXTRACT_STAGE, pdf_path)
+    return True
+
+def make_sharded_extractor(shard_size=10, concurrency=4, generate_fn=None):
+    return ShardedExtractor(
+        generate_fn or gemini_generate, build_extraction_prompt,
+        shard_size=shard_size, concurrency=concurrency,
+        cache=response_cache, model_name=GEMINI_MODEL
+    )
+
+# Extract a single PDF to output_path (used by the pipeline); returns True on success
+def extract_pdf_file(pdf_path, output_path, manifest, start_page=1, local_fast_path=True, extractor=None,
+                     expected_script=None):
+    job = plan_pdf_job(pdf_path, output_path, start_page, local_fast_path, manifest, expected_script)
+    if job is None:
+        return os.path.exists(output_path)
+    remote_results = extract_remote_ranges([job], manifest, extractor)
+    return write_pdf_job(job, remote_results, manifest)
+
+# Sharded mode: each PDF is split into shard_size-page windows that are uploaded and
+# extracted concurrently (up to `concurrency` at once); generate_fn can be swapped for
+# StubGeminiModel(...).generate to run offline.
+# Progress is kept in a manifest in output_folder: unchanged completed PDFs are skipped
+# and failed or interrupted ones only redo the page ranges that did not finish.
+# PDFs are planned, extracted and written one at a time, so only one PDF's text is held
+# in memory and every finished PDF is on disk before the next one starts.
+def process_pdf_folder(input_folder, output_folder, start_page=1, sharded=False,
+                       shard_size=10, concurrency=4, generate_fn=None, local_fast_path=True,
+                       manifest=None, expected_script=None):
+    manifest = manifest or ProcessingManifest.for_directory(output_folder)
     pdf_files = [f for f in os.listdir(input_folder) if f.lower().endswith(".pdf")]
     logger.info(f"Found {len(pdf_files)} PDF files in {input_folder}.")
 
+    extractor = make_sharded_extractor(shard_size, concurrency, generate_fn) if sharded else None
     for pdf_file in pdf_files:
         pdf_path = os.path.join(input_folder, pdf_file)
         base_name = os.path.splitext(pdf_file)[0]
         output_path = os.path.join(output_folder, f"{base_name}.jsonl")
+        extract_pdf_file(pdf_path, output_path, manifest, start_page, local_fast_path, extractor, expected_script)
 
-        total_pages = get_pdf_page_count(pdf_path)
-        if total_pages is None:
-            logger.warning(f"Skipping {pdf_file} due to page count error.")
-            continue
-
-        if start_page > total_pages:
-            logger.warning(f"Skipping {pdf_file} because start_page ({start_page}) > total pages ({total_pages})")
-            continue
-
-        extracted_text = extract_pdf_with_ai(pdf_path, start_page, total_pages)
-        if extracted_text:
-            save_jsonl_string(extracted_text, output_path)
-        else:
-            logger.warning(f"No content extracted for {pdf_file}")
+    manifest.print_summary(EXTRACT_STAGE)
 
 if __name__ == "__main__":
     input_folder = "documents/New"
     output_folder = "output/new"
-    process_pdf_folder(input_folder, output_folder, start_page=2)
+    with profile_stage("gemini_extract"):
+        process_pdf_folder(input_folder, output_folder, start_page=2)
+    export_metrics()
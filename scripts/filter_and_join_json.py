@@ -1,45 +1,114 @@
 import os
 import json
+import time
+import hashlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from triplet_store import STORE_SUFFIX, TripletStore
 
 # Set your folder path here
 input_folder = "aligned_triplets"
-output_file = "filtered_output.json"
-
-# Threshold
-threshold = 0.85
-
-# List to hold all valid entries
-filtered_entries = []
-
-# Loop through all files in the folder
-for filename in os.listdir(input_folder):
-    if filename.endswith(".json"):
-        filepath = os.path.join(input_folder, filename)
-        with open(filepath, "r", encoding="utf-8") as f:
-            try:
-                data = json.load(f)
-                # If it's a list of objects in one file, iterate through
-                if isinstance(data, list):
-                    entries = data
-                else:
-                    entries = [data]
-                for entry in entries:
-                    sim = entry.get("similarity", {})
-                    if (
-                        sim.get("eng_tam", 0) > threshold and
-                        sim.get("eng_sin", 0) > threshold and
-                        sim.get("tam_sin", 0) > threshold
-                    ):
-                        filtered_entries.append({
-                            "english": entry.get("english", ""),
-                            "tamil": entry.get("tamil", ""),
-                            "sinhala": entry.get("sinhala", ""),
-                        })
-            except json.JSONDecodeError:
-                print(f"Warning: Failed to parse {filename}")
-
-# Write the filtered entries to a new JSON file
-with open(output_file, "w", encoding="utf-8") as f:
-    json.dump(filtered_entries, f, ensure_ascii=False, indent=2)
-
-print(f"Filtered {len(filtered_entries)} entries written to '{output_file}'")
+output_file = "filtered_output.jsonl"
+
+# Per-pair thresholds; an entry is kept only if every score is above its threshold
+thresholds = {
+    "eng_tam": 0.85,
+    "eng_sin": 0.85,
+    "tam_sin": 0.85,
+}
+
+# Worker processes used to parse the input files
+num_workers = os.cpu_count() or 1
+
+
+# Yield the entries of one aligned_triplets file (a JSON array or JSONL)
+def iter_entries(filepath):
+    with open(filepath, "r", encoding="utf-8") as f:
+        if filepath.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        data = json.load(f)
+    # If it's a list of objects in one file, iterate through
+    yield from (data if isinstance(data, list) else [data])
+
+
+# Columnar stores are thresholded on the score table; only kept rows' texts are decoded
+def filter_store(path, thresholds):
+    try:
+        store = TripletStore(path)
+        rows = np.flatnonzero(store.mask(thresholds))
+        kept = [{"english": e, "tamil": t, "sinhala": s} for e, t, s in store.texts(rows)]
+    except (OSError, ValueError, KeyError):
+        return path, 0, [], False
+    return path, len(store), kept, True
+
+
+# Runs in a worker process: parse one file and keep the entries above the thresholds
+def filter_file(filepath, thresholds):
+    if filepath.endswith(STORE_SUFFIX):
+        return filter_store(filepath, thresholds)
+    kept = []
+    total = 0
+    try:
+        for entry in iter_entries(filepath):
+            total += 1
+            sim = entry.get("similarity", {})
+            if all(sim.get(pair, 0) > threshold for pair, threshold in thresholds.items()):
+                kept.append({
+                    "english": entry.get("english", ""),
+                    "tamil": entry.get("tamil", ""),
+                    "sinhala": entry.get("sinhala", ""),
+                })
+    except json.JSONDecodeError:
+        return filepath, total, kept, False
+    return filepath, total, kept, True
+
+
+def triplet_digest(entry):
+    payload = "\x1f".join((entry["english"], entry["tamil"], entry["sinhala"]))
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).digest()
+
+
+# Filter every file in input_folder in a process pool and append the kept,
+# de-duplicated triplets to output_file as JSONL while the other files are parsed
+def filter_and_join(input_folder, output_file, thresholds, num_workers=num_workers):
+    filepaths = [
+        os.path.join(input_folder, filename)
+        for filename in sorted(os.listdir(input_folder))
+        if filename.endswith((".json", ".jsonl", STORE_SUFFIX))
+    ]
+
+    seen = set()
+    stats = {"read": 0, "kept": 0, "duplicates": 0}
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=num_workers) as pool, open(output_file, "w", encoding="utf-8") as out:
+        results = pool.map(filter_file, filepaths, [thresholds] * len(filepaths))
+        for filepath, total, kept, ok in results:
+            if not ok:
+                print(f"Warning: Failed to parse {os.path.basename(filepath)}")
+            stats["read"] += total
+            for entry in kept:
+                digest = triplet_digest(entry)
+                if digest in seen:
+                    stats["duplicates"] += 1
+                    continue
+                seen.add(digest)
+                out.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                stats["kept"] += 1
+
+    elapsed = time.perf_counter() - start
+    stats["entries_per_second"] = stats["read"] / elapsed if elapsed > 0 else 0.0
+    return stats
+
+
+if __name__ == "__main__":
+    stats = filter_and_join(input_folder, output_file, thresholds)
+    print(
+        f"Filtered {stats['kept']} entries written to '{output_file}' "
+        f"({stats['duplicates']} duplicates dropped, {stats['read']} read, "
+        f"{stats['entries_per_second']:.0f} entries/s)"
+    )
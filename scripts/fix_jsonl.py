@@ -1,11 +1,18 @@
 import os
 from dotenv import load_dotenv
 import google.generativeai as genai
+from metrics import metrics, export_metrics, profile_stage
+from response_cache import ResponseCache, response_key, sha256_text
+from jsonl_repair import repair_jsonl_file
 
 # Setup Gemini
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY_TRANSLEGAL")
 genai.configure(api_key=GEMINI_API_KEY)
+GEMINI_MODEL = "gemini-2.0-flash"
+
+# Shares the Gemini response cache with filehandler.py; see GEMINI_CACHE_MODE there
+response_cache = ResponseCache("response_cache/gemini", mode=os.getenv("GEMINI_CACHE_MODE", "use"))
 
 # Load a JSONL file
 def load_jsonl(file_path):
@@ -13,8 +20,9 @@ def load_jsonl(file_path):
         lines = f.readlines()
     return lines
 
-# Clean JSONL using Gemini
-def clean_jsonl_with_gemini(lines, filename=None):
+# Clean JSONL using Gemini (now only used for fragments the local repair cannot recover)
+def clean_jsonl_with_gemini(lines, filename=None, cache=None):
+    cache = response_cache if cache is None else cache
     input_text = "".join(lines)
     prompt = (
         f"I have a JSONL file that may contain english or tamil or sinhala text that looks like this:\n"
@@ -27,9 +35,15 @@ def clean_jsonl_with_gemini(lines, filename=None):
         "Return only the cleaned JSONL content."
     )
 
-    model = genai.GenerativeModel("gemini-2.0-flash")
-    response = model.generate_content(prompt)
-    return response.text
+    def generate():
+        model = genai.GenerativeModel(GEMINI_MODEL)
+        metrics.inc("remote_bytes_sent_total", len(prompt.encode("utf-8")), service="gemini_cleanup")
+        with metrics.timer("remote_call_seconds", service="gemini_cleanup"):
+            response = model.generate_content(prompt)
+        return response.text
+
+    key = response_key(sha256_text(input_text), None, prompt, GEMINI_MODEL)
+    return cache.get_or_call(key, generate, model=GEMINI_MODEL, source=filename)
 
 # Save cleaned content
 def save_cleaned_jsonl(output_path, cleaned_text):
@@ -37,26 +51,47 @@ def save_cleaned_jsonl(output_path, cleaned_text):
     with open(output_path, "w", encoding="utf-8") as f:
         f.write(cleaned_text.strip())
 
+# Repair a JSONL file locally; only fragments the parser cannot recover go to Gemini
+def clean_jsonl_file(input_path, output_path, use_gemini_fallback=True):
+    filename = os.path.basename(input_path)
+
+    def escalate(fragment):
+        return clean_jsonl_with_gemini([fragment], filename)
+
+    return repair_jsonl_file(input_path, output_path, escalate if use_gemini_fallback else None)
+
 # Process all JSONL files in a folder
-def clean_jsonl_folder(input_folder, output_folder):
+def clean_jsonl_folder(input_folder, output_folder, use_gemini_fallback=True):
     jsonl_files = [f for f in os.listdir(input_folder) if f.endswith(".jsonl")]
     print(f"Found {len(jsonl_files)} JSONL files to clean.")
 
+    totals = {"repaired": 0, "escalated": 0, "dropped": 0}
     for jsonl_file in jsonl_files:
         input_path = os.path.join(input_folder, jsonl_file)
         output_path = os.path.join(output_folder, jsonl_file)
 
         print(f"Cleaning {jsonl_file}...")
         try:
-            lines = load_jsonl(input_path)
-            cleaned_text = clean_jsonl_with_gemini(lines, jsonl_file)
-            save_cleaned_jsonl(output_path, cleaned_text)
-            print(f"✅ Saved cleaned file to {output_path}")
+            stats = clean_jsonl_file(input_path, output_path, use_gemini_fallback)
+            for key in totals:
+                totals[key] += stats[key]
+            print(
+                f"✅ Saved cleaned file to {output_path} "
+                f"({stats['objects']} objects: {stats['repaired']} repaired locally, "
+                f"{stats['escalated']} escalated, {stats['dropped']} dropped)"
+            )
         except Exception as e:
             print(f"❌ Failed to process {jsonl_file}: {e}")
 
+    print(
+        f"Repaired locally: {totals['repaired']}, escalated to Gemini: {totals['escalated']}, "
+        f"dropped: {totals['dropped']}"
+    )
+
 # Main
 if __name__ == "__main__":
     input_folder = "output/new"  # Input JSONL files
     output_folder = "cleaned_jsonl/new"  # Output folder for cleaned files
-    clean_jsonl_folder(input_folder, output_folder)
+    with profile_stage("jsonl_cleanup"):
+        clean_jsonl_folder(input_folder, output_folder)
+    export_metrics()
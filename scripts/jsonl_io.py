@@ -0,0 +1,23 @@
+import json
+
+from text_normalize import normalize_text
+
+
+# Load sentences from JSONL
+def load_jsonl_sentences(filepath):
+    sentences = []
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+                text = obj.get("paragraph_content") or obj.get("paragraph") or obj.get("text", "")
+                text = normalize_text(text)
+
+                if text:
+                    sentences.append(text)
+            except json.JSONDecodeError as e:
+                print(f"⚠️ Skipping invalid line in {filepath}: {e}")
+    return sentences
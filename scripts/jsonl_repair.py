@@ -0,0 +1,173 @@
+import os
+import re
+import json
+
+from text_normalize import normalize_text
+
+FENCE_PATTERN = re.compile(r"^\s*```")
+TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+NEWLINE_PATTERN = re.compile(r"\s*(?:\r\n|\r|\n|\\n|\\r)+\s*")
+CLOSERS = {"{": "}", "[": "]"}
+
+
+# Remove (escaped) newlines inside text values, recursively
+def clean_value(value):
+    if isinstance(value, str):
+        return normalize_text(NEWLINE_PATTERN.sub(" ", value))
+    if isinstance(value, dict):
+        return {k: clean_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [clean_value(v) for v in value]
+    return value
+
+
+def parse_object(text):
+    for candidate in (text, TRAILING_COMMA_PATTERN.sub(r"\1", text)):
+        try:
+            obj = json.loads(candidate, strict=False)
+        except ValueError:
+            continue
+        if isinstance(obj, dict):
+            return obj
+    return None
+
+
+# Streaming repair of LLM-produced JSONL. Lines are fed one at a time and only the
+# object currently being read is buffered, so memory stays constant per file.
+# Handles code fences, stray text and array brackets between objects, several
+# objects on one line, objects spread over several lines, raw newlines inside
+# strings and objects cut off mid-string. Fragments that still do not parse are
+# passed to escalate_fn(fragment) -> JSONL text, when given, or dropped.
+class JsonlRepairer:
+    def __init__(self, escalate_fn=None, max_fragment_chars=200_000):
+        self.escalate_fn = escalate_fn
+        self.max_fragment_chars = max_fragment_chars
+        self.stats = {"lines": 0, "objects": 0, "clean": 0, "repaired": 0, "escalated": 0, "dropped": 0}
+        self._reset()
+
+    def _reset(self):
+        self.buffer = []
+        self.buffer_chars = 0
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+
+    def _emit(self, obj, repaired):
+        cleaned = clean_value(obj)
+        self.stats["objects"] += 1
+        self.stats["repaired" if repaired or cleaned != obj else "clean"] += 1
+        return json.dumps(cleaned, ensure_ascii=False)
+
+    def _escalate(self, fragment):
+        if self.escalate_fn is None or not fragment.strip():
+            self.stats["dropped"] += 1
+            return []
+
+        self.stats["escalated"] += 1
+        recovered = JsonlRepairer()
+        out = []
+        for line in self.escalate_fn(fragment).splitlines():
+            out.extend(recovered.feed(line))
+        out.extend(recovered.finish())
+        if not out:
+            self.stats["dropped"] += 1
+        self.stats["objects"] += len(out)
+        return out
+
+    def _complete(self, text):
+        obj = parse_object(text)
+        if obj is not None:
+            return [self._emit(obj, repaired=True)]
+        return self._escalate(text)
+
+    # Close an object that was cut off: end the open string and every open container
+    def _close_truncated(self):
+        text = "".join(self.buffer)
+        if self.in_string:
+            if self.escape:
+                text = text[:-1]
+            text += '"'
+        text = text.rstrip().rstrip(",")
+        if text.endswith(":"):
+            text += " null"
+        text += "".join(CLOSERS[c] for c in reversed(self.stack))
+        self._reset()
+        return self._complete(text)
+
+    def feed(self, line):
+        self.stats["lines"] += 1
+        out = []
+        stripped = line.strip()
+
+        if not self.stack:
+            if not stripped or FENCE_PATTERN.match(line):
+                return out
+            if stripped.startswith("{") and stripped.endswith("}"):
+                obj = parse_object(stripped)
+                if obj is not None:
+                    out.append(self._emit(obj, repaired=False))
+                    return out
+        elif self.in_string and stripped.startswith('{"'):
+            # The previous object was cut off inside a string value
+            out.extend(self._close_truncated())
+
+        start = None if not self.stack else 0
+        for i, ch in enumerate(line):
+            if not self.stack:
+                # Outside an object: skip stray text, commas and array brackets
+                if ch == "{":
+                    self.stack.append(ch)
+                    start = i
+                continue
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if ch == '"':
+                self.in_string = True
+            elif ch in CLOSERS:
+                self.stack.append(ch)
+            elif ch in "}]" and self.stack and CLOSERS[self.stack[-1]] == ch:
+                self.stack.pop()
+                if not self.stack:
+                    self.buffer.append(line[start:i + 1])
+                    text = "".join(self.buffer)
+                    self._reset()
+                    out.extend(self._complete(text))
+                    start = None
+
+        if self.stack:
+            self.buffer.append(line[start:])
+            self.buffer_chars += len(line) - start
+            if self.buffer_chars > self.max_fragment_chars:
+                text = "".join(self.buffer)
+                self._reset()
+                out.extend(self._escalate(text))
+        return out
+
+    def finish(self):
+        if self.stack:
+            return self._close_truncated()
+        return []
+
+
+# Repair input_path into output_path line by line; returns the repair statistics
+def repair_jsonl_file(input_path, output_path, escalate_fn=None):
+    repairer = JsonlRepairer(escalate_fn=escalate_fn)
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    with open(input_path, "r", encoding="utf-8") as src, open(output_path, "w", encoding="utf-8") as dst:
+        for line in src:
+            for record in repairer.feed(line):
+                dst.write(record + "\n")
+        for record in repairer.finish():
+            dst.write(record + "\n")
+    return repairer.stats
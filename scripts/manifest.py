@@ -0,0 +1,148 @@
+import os
+import sys
+import time
+import sqlite3
+import threading
+
+MANIFEST_FILE = ".manifest.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    stage TEXT NOT NULL,
+    path TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (stage, path)
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    stage TEXT NOT NULL,
+    path TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (stage, path, content_hash, chunk_index)
+);
+"""
+
+
+# SQLite manifest kept next to the output. It records, per stage and file, the
+# content hash and status (running / done / failed) plus every finished chunk's
+# result, so reruns skip unchanged completed files and resume failed ones from
+# their last finished chunk. Safe to share between worker threads.
+class ProcessingManifest:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    @classmethod
+    def for_directory(cls, directory):
+        os.makedirs(directory, exist_ok=True)
+        return cls(os.path.join(directory, MANIFEST_FILE))
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor.fetchall()
+
+    def is_complete(self, stage, path, content_hash):
+        rows = self._execute(
+            "SELECT 1 FROM files WHERE stage = ? AND path = ? AND content_hash = ? AND status = 'done'",
+            (stage, path, content_hash),
+        )
+        return bool(rows)
+
+    # Mark a file as running; chunks recorded for an older version of it are dropped
+    def start(self, stage, path, content_hash):
+        self._execute(
+            "DELETE FROM chunks WHERE stage = ? AND path = ? AND content_hash != ?",
+            (stage, path, content_hash),
+        )
+        self._execute(
+            "INSERT OR REPLACE INTO files (stage, path, content_hash, status, error, updated_at) "
+            "VALUES (?, ?, ?, 'running', NULL, ?)",
+            (stage, path, content_hash, time.time()),
+        )
+
+    def complete(self, stage, path):
+        self._execute(
+            "UPDATE files SET status = 'done', error = NULL, updated_at = ? WHERE stage = ? AND path = ?",
+            (time.time(), stage, path),
+        )
+
+    def fail(self, stage, path, error):
+        self._execute(
+            "UPDATE files SET status = 'failed', error = ?, updated_at = ? WHERE stage = ? AND path = ?",
+            (str(error), time.time(), stage, path),
+        )
+
+    def chunk_result(self, stage, path, content_hash, chunk_index):
+        rows = self._execute(
+            "SELECT text FROM chunks WHERE stage = ? AND path = ? AND content_hash = ? AND chunk_index = ?",
+            (stage, path, content_hash, chunk_index),
+        )
+        return rows[0][0] if rows else None
+
+    def save_chunk(self, stage, path, content_hash, chunk_index, text):
+        self._execute(
+            "INSERT OR REPLACE INTO chunks (stage, path, content_hash, chunk_index, text) VALUES (?, ?, ?, ?, ?)",
+            (stage, path, content_hash, chunk_index, text),
+        )
+
+    # Files that are not done yet: (stage, path, status, finished chunks, error)
+    def pending_and_failed(self, stage=None):
+        sql = (
+            "SELECT f.stage, f.path, f.status, "
+            "(SELECT COUNT(*) FROM chunks c WHERE c.stage = f.stage AND c.path = f.path "
+            "AND c.content_hash = f.content_hash), f.error "
+            "FROM files f WHERE f.status != 'done'"
+        )
+        params = ()
+        if stage is not None:
+            sql += " AND f.stage = ?"
+            params = (stage,)
+        return self._execute(sql + " ORDER BY f.stage, f.status, f.path", params)
+
+    def counts(self, stage=None):
+        sql = "SELECT status, COUNT(*) FROM files"
+        params = ()
+        if stage is not None:
+            sql += " WHERE stage = ?"
+            params = (stage,)
+        return dict(self._execute(sql + " GROUP BY status", params))
+
+    def print_summary(self, stage=None):
+        counts = self.counts(stage)
+        print(
+            f"\nDone: {counts.get('done', 0)}, running/interrupted: {counts.get('running', 0)}, "
+            f"failed: {counts.get('failed', 0)}"
+        )
+        for row_stage, path, status, chunks_done, error in self.pending_and_failed(stage):
+            line = f"  [{row_stage}] {status:<8} {path} ({chunks_done} chunk(s) finished)"
+            if error:
+                line += f": {error}"
+            print(line)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Summary command: python manifest.py <output directory or manifest file> [stage]
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python manifest.py <output directory or manifest file> [stage]")
+        sys.exit(1)
+
+    target = sys.argv[1]
+    db_path = os.path.join(target, MANIFEST_FILE) if os.path.isdir(target) else target
+    if not os.path.exists(db_path):
+        print(f"No manifest found at {db_path}")
+        sys.exit(1)
+
+    ProcessingManifest(db_path).print_summary(sys.argv[2] if len(sys.argv) > 2 else None)
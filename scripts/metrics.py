@@ -0,0 +1,258 @@
+import os
+import sys
+import json
+import time
+import logging
+import itertools
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger("metrics")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# PIPELINE_PROFILE=cprofile,tracemalloc turns on the profiling hooks; PIPELINE_PROFILE_DIR
+# says where cProfile output goes. Read once, so the hooks cost nothing when unset.
+PROFILE_MODES = {m.strip() for m in os.getenv("PIPELINE_PROFILE", "").lower().split(",") if m.strip()}
+PROFILE_DIR = os.getenv("PIPELINE_PROFILE_DIR", "profiles")
+_profile_ids = itertools.count()
+
+# From Python 3.12 a cProfile profiler sees every thread and only one may be enabled
+# at a time, so concurrent stages share one process-wide profiler; before 3.12 a
+# profiler only sees the thread that enabled it, so each stage gets its own.
+SHARED_PROFILER = sys.version_info >= (3, 12)
+_shared_profiler = None
+_shared_profiler_stages = []
+_shared_profiler_names = []
+_profiler_lock = threading.Lock()
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=None):
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def to_dict(self):
+        cumulative, running = {}, 0
+        for bound, count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            running += count
+            cumulative[str(bound)] = running
+        return {"count": self.count, "sum": round(self.sum, 6), "buckets": cumulative}
+
+
+# Thread-safe in-process registry of counters, gauges and latency histograms
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self.gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        with self._lock:
+            def series(store, convert=lambda v: v):
+                out = {}
+                for (name, key), value in sorted(store.items()):
+                    out.setdefault(name, []).append({"labels": dict(key), "value": convert(value)})
+                return out
+            return {
+                "timestamp": time.time(),
+                "counters": series(self.counters),
+                "gauges": series(self.gauges),
+                "histograms": series(self.histograms, Histogram.to_dict),
+            }
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            for kind, store in (("counter", self.counters), ("gauge", self.gauges)):
+                for name in sorted({name for name, _ in store}):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for (metric, key), value in sorted(store.items()):
+                        if metric == name:
+                            lines.append(f"{name}{_format_labels(key)} {value}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, key), hist in sorted(self.histograms.items(), key=lambda item: item[0]):
+                    if metric != name:
+                        continue
+                    running = 0
+                    for bound, count in zip(list(hist.buckets) + ["+Inf"], hist.counts):
+                        running += count
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', bound))} {running}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {hist.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        _atomic_write(path, self.to_prometheus())
+
+    def write_json(self, path):
+        _atomic_write(path, json.dumps(self.snapshot(), indent=2))
+
+
+def _atomic_write(path, text):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+# Process-wide registry used by every stage
+metrics = MetricsRegistry()
+
+
+# Write the metrics to METRICS_PROM_FILE / METRICS_JSON_FILE when those are set
+def export_metrics(prom_path=None, json_path=None):
+    prom_path = prom_path or os.getenv("METRICS_PROM_FILE")
+    json_path = json_path or os.getenv("METRICS_JSON_FILE")
+    if prom_path:
+        metrics.write_prometheus(prom_path)
+        logger.info(f"Wrote Prometheus metrics to {prom_path}")
+    if json_path:
+        metrics.write_json(json_path)
+        logger.info(f"Wrote metrics snapshot to {json_path}")
+
+
+def _dump_profile(profiler, name):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{name}.{os.getpid()}.{next(_profile_ids)}.prof")
+    profiler.dump_stats(path)
+    logger.info(f"[{name}] cProfile stats written to {path}")
+
+
+# Returns what _stop_cprofile needs, or None when no profiler could be enabled
+def _start_cprofile(name):
+    global _shared_profiler
+    import cProfile
+    with _profiler_lock:
+        if SHARED_PROFILER and _shared_profiler is not None:
+            _shared_profiler_stages.append(name)
+            if name not in _shared_profiler_names:
+                _shared_profiler_names.append(name)
+            return "shared"
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Another profiling tool (a debugger, an outer cProfile run) owns the hook
+            logger.warning(f"[{name}] cProfile skipped: {e}")
+            return None
+        if not SHARED_PROFILER:
+            return profiler
+        _shared_profiler = profiler
+        _shared_profiler_stages.append(name)
+        _shared_profiler_names[:] = [name]
+        return "shared"
+
+
+# The shared profiler is dumped when the last stage using it finishes, named after all of them
+def _stop_cprofile(name, token):
+    global _shared_profiler
+    if token is None:
+        return
+    if token != "shared":
+        token.disable()
+        _dump_profile(token, name)
+        return
+    with _profiler_lock:
+        _shared_profiler_stages.remove(name)
+        if _shared_profiler_stages:
+            return
+        profiler, names = _shared_profiler, "+".join(_shared_profiler_names)
+        _shared_profiler = None
+    profiler.disable()
+    _dump_profile(profiler, names)
+
+
+# Wrap any stage with cProfile and/or tracemalloc when PIPELINE_PROFILE asks for it.
+# Profiling problems are logged and never fail the stage.
+@contextmanager
+def profile_stage(name):
+    if not PROFILE_MODES:
+        yield
+        return
+
+    profiler = None
+    before = None
+    tracing = "tracemalloc" in PROFILE_MODES
+    try:
+        if "cprofile" in PROFILE_MODES:
+            profiler = _start_cprofile(name)
+        if tracing:
+            import tracemalloc
+            # Left running afterwards: other stages may be tracing concurrently
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+    except Exception as e:
+        logger.warning(f"[{name}] profiling setup failed: {e}")
+
+    try:
+        yield
+    finally:
+        try:
+            _stop_cprofile(name, profiler)
+            if before is not None:
+                top = tracemalloc.take_snapshot().compare_to(before, "lineno")[:10]
+                _, peak = tracemalloc.get_traced_memory()
+                logger.info(f"[{name}] tracemalloc peak {peak / 1024 / 1024:.1f} MiB; top allocations:")
+                for stat in top:
+                    logger.info(f"  {stat}")
+        except Exception as e:
+            logger.warning(f"[{name}] profiling report failed: {e}")
@@ -0,0 +1,69 @@
+import os
+import json
+from ann_index import IVFIndex
+from jsonl_io import load_jsonl_sentences
+# Same model and persistent embedding store as the aligner, so paragraphs embedded by
+# either script are cache hits for the other
+from sentence_pair_multiligual_embeddings import embedding_cache, encode_with_prefix
+
+LANGUAGES = {"e": "english", "t": "tamil", "s": "sinhala"}
+
+
+def language_of(filename):
+    if not filename.endswith(".jsonl") or "-" not in filename:
+        return None
+    return LANGUAGES.get(filename[:-len(".jsonl")].rsplit("-", 1)[1])
+
+
+# Add every Tamil and Sinhala file to the index; files already indexed unchanged are skipped
+def update_index(index, input_dir):
+    added = 0
+    for filename in sorted(os.listdir(input_dir)):
+        lang = language_of(filename)
+        if lang not in ("tamil", "sinhala"):
+            continue
+        path = os.path.join(input_dir, filename)
+        if index.add_jsonl_file(path, lang, load_jsonl_sentences(path), encode_with_prefix):
+            print(f"➕ Indexed {filename}")
+            added += 1
+    print(f"🗂️ Index holds {len(index)} paragraphs ({added} new file(s))")
+
+
+def candidates(matches):
+    return [
+        {"text": meta["text"], "file": os.path.basename(meta["file"]), "paragraph": meta["paragraph"], "score": round(score, 4)}
+        for meta, score in matches
+    ]
+
+
+# Query the corpus-wide index with every English paragraph, whatever its file group
+def mine_candidates(index, input_dir, output_dir, top_k=5):
+    os.makedirs(output_dir, exist_ok=True)
+    for filename in sorted(os.listdir(input_dir)):
+        if language_of(filename) != "english":
+            continue
+
+        english_sentences = load_jsonl_sentences(os.path.join(input_dir, filename))
+        if not english_sentences:
+            continue
+        print(f"\n🔍 Mining candidates for {filename}")
+
+        eng_embeddings = encode_with_prefix(english_sentences)
+        tamil_matches = index.search(eng_embeddings, k=top_k, lang="tamil")
+        sinhala_matches = index.search(eng_embeddings, k=top_k, lang="sinhala")
+
+        base_name = filename[:-len(".jsonl")].rsplit("-", 1)[0]
+        output_path = os.path.join(output_dir, f"mined_candidates_{base_name}.jsonl")
+        with open(output_path, "w", encoding="utf-8") as f:
+            for text, tam, sin in zip(english_sentences, tamil_matches, sinhala_matches):
+                record = {"english": text, "tamil_candidates": candidates(tam), "sinhala_candidates": candidates(sin)}
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        print(f"✅ Saved candidates for {len(english_sentences)} paragraphs to '{output_path}'")
+
+
+if __name__ == "__main__":
+    input_dir = "cleaned_jsonl/new"
+    index = IVFIndex("ann_index/e5")
+    update_index(index, input_dir)
+    mine_candidates(index, input_dir, "mined_candidates")
+    embedding_cache.save()
@@ -0,0 +1,226 @@
+import numpy as np
+
+from alignment_engine import normalize_rows, triplet_record
+from metrics import metrics
+
+NEG_INF = -np.inf
+
+# Largest low-confidence region (sources x targets) that is re-aligned with every
+# pairing allowed; the pure-Python DP costs roughly 12 µs per cell. Larger regions get
+# the widest band that stays within this many cells.
+FALLBACK_MAX_CELLS = 100_000
+
+
+def merged_vector(embeddings, indices):
+    vector = np.sum(embeddings[list(indices)], axis=0)
+    return vector / max(np.linalg.norm(vector), 1e-8)
+
+
+def _pair_sums(embeddings):
+    if len(embeddings) < 2:
+        return np.zeros((0, embeddings.shape[1]), dtype=np.float32)
+    return normalize_rows(embeddings[:-1] + embeddings[1:])
+
+
+# Scores of beads that start at one source paragraph, averaged over one or more
+# (source, target) embedding views. A merged side is scored by the normalized sum
+# of its two paragraph vectors.
+class BeadScorer:
+    def __init__(self, views):
+        self.views = []
+        for source, target in views:
+            source, target = normalize_rows(source), normalize_rows(target)
+            self.views.append((source, target, _pair_sums(source), _pair_sums(target)))
+        self.n = len(self.views[0][0])
+        self.m = len(self.views[0][1])
+
+    # 1–1, 1–2 and 2–1 scores for source i against target starts a..b-1
+    def window(self, i, a, b):
+        s11, s12, s21 = (np.zeros(b - a, dtype=np.float32) for _ in range(3))
+        b12 = max(a, min(b, self.m - 1))
+        for source, target, source_pairs, target_pairs in self.views:
+            s11 += target[a:b] @ source[i]
+            s12[:b12 - a] += target_pairs[a:b12] @ source[i]
+            if i + 1 < self.n:
+                s21 += target[a:b] @ source_pairs[i]
+        # No second target paragraph after m-1, no second source paragraph after n-1
+        s12[b12 - a:] = NEG_INF
+        if i + 1 >= self.n:
+            s21[:] = NEG_INF
+        k = len(self.views)
+        return s11 / k, s12 / k, s21 / k
+
+    # Best 1–1 score of every source paragraph against any target, in row blocks
+    def row_best(self, block=1024):
+        if self.m == 0:
+            return np.full(self.n, NEG_INF, dtype=np.float32)
+        best = np.empty(self.n, dtype=np.float32)
+        for start in range(0, self.n, block):
+            scores = sum(source[start:start + block] @ target.T for source, target, _, _ in self.views)
+            best[start:start + block] = scores.max(axis=1) / len(self.views)
+        return best
+
+
+# Dynamic programme over sources [i0, i1) x targets [j0, j1). Only cells within
+# `band` columns of the diagonal are scored (band=None scores every cell). Beads are
+# 1–1, 1–2, 2–1 matches and 1–0 / 0–1 gaps; the path with the highest total score is
+# returned as (source indices, target indices, score) tuples in document order.
+def _banded_dp(scorer, i0, i1, j0, j1, band, gap_score, merge_penalty):
+    n, m = i1 - i0, j1 - j0
+    if n == 0 or m == 0:
+        return [((i0 + r,), (), 0.0) for r in range(n)] + [((), (j0 + c,), 0.0) for c in range(m)]
+
+    # Wide enough for consecutive rows' bands to overlap, so (n, m) is always reachable
+    w = max(n, m) if band is None else max(band, -(-m // n) + 1)
+    centers = np.rint(np.arange(n + 1) * m / n).astype(int)
+    lo = np.maximum(0, centers - w)
+    hi = np.minimum(m, centers + w)
+
+    # Score windows: the beads starting at source r are needed by rows r+1 and r+2
+    windows = []
+    for r in range(n):
+        a = max(0, lo[r + 1] - 2)
+        b = max(a, hi[min(r + 2, n)])
+        windows.append((a, *scorer.window(i0 + r, j0 + a, j0 + b)))
+
+    def bead_score(kind, r, c):
+        a, s11, s12, s21 = windows[r]
+        k = c - a
+        if k < 0 or k >= len(s11):
+            return NEG_INF
+        return (s11, s12, s21)[kind][k]
+
+    table = [np.full(hi[r] - lo[r] + 1, NEG_INF) for r in range(n + 1)]
+    moves = [np.full(hi[r] - lo[r] + 1, -1, dtype=np.int8) for r in range(n + 1)]
+    table[0][0] = 0.0
+
+    def value(r, c):
+        if r < 0 or c < lo[r] or c > hi[r]:
+            return NEG_INF
+        return table[r][c - lo[r]]
+
+    # (sources consumed, targets consumed) for moves 0..4
+    steps = ((1, 1), (1, 2), (2, 1), (1, 0), (0, 1))
+    for r in range(n + 1):
+        for c in range(lo[r], hi[r] + 1):
+            if r == 0 and c == 0:
+                continue
+            candidates = (
+                value(r - 1, c - 1) + bead_score(0, r - 1, c - 1) if r >= 1 and c >= 1 else NEG_INF,
+                value(r - 1, c - 2) + bead_score(1, r - 1, c - 2) - merge_penalty if r >= 1 and c >= 2 else NEG_INF,
+                value(r - 2, c - 1) + bead_score(2, r - 2, c - 1) - merge_penalty if r >= 2 and c >= 1 else NEG_INF,
+                value(r - 1, c) + gap_score,
+                value(r, c - 1) + gap_score,
+            )
+            move = int(np.argmax(candidates))
+            table[r][c - lo[r]] = candidates[move]
+            moves[r][c - lo[r]] = move
+
+    beads = []
+    r, c = n, m
+    while r > 0 or c > 0:
+        move = moves[r][c - lo[r]]
+        dr, dc = steps[move]
+        src = tuple(i0 + k for k in range(r - dr, r))
+        tgt = tuple(j0 + k for k in range(c - dc, c))
+        score = float(bead_score(move, r - dr, c - dc)) if move < 3 else 0.0
+        beads.append((src, tgt, score))
+        r, c = r - dr, c - dc
+    beads.reverse()
+    return beads
+
+
+# Spans of consecutive low-confidence beads (gaps included), widened by `margin` beads
+# on each side; returns (first bead, last bead + 1) pairs. A bead is low-confidence when
+# it scores below relative_confidence times the best score its source paragraphs reach
+# against any target (row_best), or below the absolute min_confidence when one is given.
+def _low_confidence_runs(beads, row_best, relative_confidence, min_confidence, margin):
+    floor = NEG_INF if min_confidence is None else min_confidence
+    low = [
+        not (src and tgt) or score < floor or score < relative_confidence * max(row_best[i] for i in src)
+        for src, tgt, score in beads
+    ]
+    runs = []
+    k = 0
+    while k < len(beads):
+        if not low[k]:
+            k += 1
+            continue
+        start = k
+        while k < len(beads) and low[k]:
+            k += 1
+        start, end = max(0, start - margin), min(len(beads), k + margin)
+        if runs and start <= runs[-1][1]:
+            runs[-1] = (runs[-1][0], end)
+        else:
+            runs.append((start, end))
+    return runs
+
+
+def _span(beads, side):
+    indices = [i for bead in beads for i in bead[side]]
+    return (min(indices), max(indices) + 1) if indices else None
+
+
+# Monotonic alignment of parallel documents that keep their paragraph order.
+# views is a list of (source embeddings, target embeddings) pairs whose similarities
+# are averaged. The banded pass costs O(n·band); each run of low-confidence beads is
+# then re-aligned with every pairing inside the run allowed, or with a wider band when
+# the run exceeds FALLBACK_MAX_CELLS. Confidence is relative to each source row's best
+# score, so the same default works for encoders with different score ranges (LASER
+# spreads over 0.3–0.9, e5 over 0.7–1.0); min_confidence adds an absolute floor.
+def banded_align(views, band=16, gap_score=0.0, merge_penalty=0.05, relative_confidence=0.9,
+                 min_confidence=None, margin=1):
+    scorer = BeadScorer(views)
+    with metrics.timer("alignment_assign_seconds", mode="banded"):
+        beads = _banded_dp(scorer, 0, scorer.n, 0, scorer.m, band, gap_score, merge_penalty)
+
+        row_best = scorer.row_best()
+        for start, end in reversed(_low_confidence_runs(beads, row_best, relative_confidence, min_confidence, margin)):
+            region = beads[start:end]
+            src_span, tgt_span = _span(region, 0), _span(region, 1)
+            if src_span is None or tgt_span is None:
+                continue
+            n, m = src_span[1] - src_span[0], tgt_span[1] - tgt_span[0]
+            region_band = None
+            if n * m > FALLBACK_MAX_CELLS:
+                region_band = FALLBACK_MAX_CELLS // (2 * max(n, m))
+                if region_band <= band:
+                    metrics.inc("banded_fallback_skipped_total")
+                    continue
+            metrics.inc("banded_fallback_regions_total")
+            beads[start:end] = _banded_dp(scorer, *src_span, *tgt_span, region_band, gap_score, merge_penalty)
+    return beads
+
+
+# Banded counterpart of alignment_engine.align_triplets. English is aligned to Tamil
+# first; the resulting English+Tamil units are then aligned to Sinhala on the average
+# of their English–Sinhala and Tamil–Sinhala similarities. Merged paragraphs are
+# joined with a space in the output records; unmatched paragraphs are not emitted.
+def align_triplets_banded(english_sentences, tamil_sentences, sinhala_sentences,
+                          eng_embeddings, tam_embeddings, sin_embeddings, band=16, relative_confidence=0.9,
+                          min_confidence=None):
+    confidence = {"relative_confidence": relative_confidence, "min_confidence": min_confidence}
+    eng, tam, sin = (normalize_rows(e) for e in (eng_embeddings, tam_embeddings, sin_embeddings))
+    et_beads = [(e, t) for e, t, _ in banded_align([(eng, tam)], band, **confidence) if e and t]
+    if not et_beads:
+        return []
+
+    eng_units = np.stack([merged_vector(eng, e) for e, _ in et_beads])
+    tam_units = np.stack([merged_vector(tam, t) for _, t in et_beads])
+    unit_beads = banded_align([(eng_units, sin), (tam_units, sin)], band, **confidence)
+
+    records = []
+    for units, s_idx, _ in unit_beads:
+        if not units or not s_idx:
+            continue
+        e_idx = [i for u in units for i in et_beads[u][0]]
+        t_idx = [i for u in units for i in et_beads[u][1]]
+        e_vec, t_vec, s_vec = merged_vector(eng, e_idx), merged_vector(tam, t_idx), merged_vector(sin, s_idx)
+        records.append(triplet_record(
+            " ".join(english_sentences[i] for i in e_idx),
+            " ".join(tamil_sentences[i] for i in t_idx),
+            " ".join(sinhala_sentences[i] for i in s_idx),
+            e_vec @ t_vec, e_vec @ s_vec, t_vec @ s_vec,
+        ))
+    return records
@@ -0,0 +1,178 @@
+import os
+import json
+import zlib
+import hashlib
+import argparse
+
+import numpy as np
+
+from jsonl_io import load_jsonl_sentences
+from metrics import metrics
+from text_normalize import normalize_text
+
+PROVENANCE_FILE = "dedup_provenance.jsonl"
+
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+
+# Shared normalization plus lowercasing; the identity used for exact duplicates and shingles
+def dedup_key(text):
+    return normalize_text(text).lower()
+
+
+def text_key(text):
+    return hashlib.sha256(dedup_key(text).encode("utf-8")).hexdigest()
+
+
+# Character shingles work the same for English, Tamil and Sinhala, which do not
+# share a word tokenizer; texts shorter than k become a single shingle
+def shingle_hashes(text, k=5):
+    text = dedup_key(text)
+    shingles = {text[i:i + k] for i in range(max(1, len(text) - k + 1))}
+    return np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+
+# MinHash signatures and banded LSH over every paragraph seen so far. Paragraphs
+# whose normalized text was seen before are exact duplicates; otherwise LSH
+# candidates whose estimated Jaccard similarity reaches `threshold` are near
+# duplicates. Each group keeps its first occurrence; `occurrences` records every
+# (file, paragraph) of each kept paragraph for the provenance map.
+class NearDuplicateIndex:
+    def __init__(self, threshold=0.8, num_perm=128, bands=16, shingle_size=5, seed=1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        rng = np.random.default_rng(seed)
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        # Multiply-shift hashing: (a*x + b) mod 2^64, keeping the top 32 bits
+        self.a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self.buckets = [{} for _ in range(bands)]
+        self.exact = {}
+        self.signatures = []
+        self.texts = []
+        self.occurrences = []
+
+    def signature(self, text):
+        x = shingle_hashes(text, self.shingle_size)
+        with np.errstate(over="ignore"):
+            hashed = (self.a[:, None] * x[None, :] + self.b[:, None]) >> np.uint64(32)
+        return (hashed & _MASK32).min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    # Returns (paragraph id, similarity, kind) with kind "exact", "near" or "new"
+    def add(self, text, occurrence):
+        key = text_key(text)
+        if key in self.exact:
+            doc_id = self.exact[key]
+            self.occurrences[doc_id].append({**occurrence, "similarity": 1.0})
+            return doc_id, 1.0, "exact"
+
+        signature = self.signature(text)
+        band_keys = self._band_keys(signature)
+        candidates = {doc_id for band, band_key in enumerate(band_keys) for doc_id in self.buckets[band].get(band_key, ())}
+        best_id, best_sim = None, 0.0
+        for doc_id in candidates:
+            sim = float(np.mean(self.signatures[doc_id] == signature))
+            if sim > best_sim:
+                best_id, best_sim = doc_id, sim
+        if best_id is not None and best_sim >= self.threshold:
+            self.exact[key] = best_id
+            self.occurrences[best_id].append({**occurrence, "similarity": round(best_sim, 4)})
+            return best_id, best_sim, "near"
+
+        doc_id = len(self.texts)
+        self.exact[key] = doc_id
+        self.signatures.append(signature)
+        self.texts.append(text)
+        self.occurrences.append([{**occurrence, "similarity": 1.0}])
+        for band, band_key in enumerate(band_keys):
+            self.buckets[band].setdefault(band_key, []).append(doc_id)
+        return doc_id, 1.0, "new"
+
+    # One record per kept paragraph that absorbed duplicates; the first occurrence is the one kept
+    def write_provenance(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for text, occurrences in zip(self.texts, self.occurrences):
+                if len(occurrences) > 1:
+                    record = {"key": text_key(text), "text": text, "kept": occurrences[0], "duplicates": occurrences[1:]}
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, path)
+
+
+# Drop exact and near-duplicate paragraphs from one JSONL file; duplicates of
+# paragraphs from earlier files (any document in the corpus) are dropped too.
+# Each language is deduplicated on its own, so the parallel files of one document
+# can lose different paragraphs; order-based alignment (mode "banded") then sees
+# shifted paragraph sequences.
+def dedup_jsonl_file(index, input_path, output_path):
+    stats = {"paragraphs": 0, "kept": 0, "exact": 0, "near": 0}
+    name = os.path.basename(input_path)
+    with open(output_path, "w", encoding="utf-8") as out:
+        for position, text in enumerate(load_jsonl_sentences(input_path)):
+            _, _, kind = index.add(text, {"file": name, "paragraph": position})
+            stats["paragraphs"] += 1
+            metrics.inc("dedup_paragraphs_total", result=kind)
+            if kind == "new":
+                stats["kept"] += 1
+                out.write(json.dumps({"paragraph": text}, ensure_ascii=False) + "\n")
+            else:
+                stats[kind] += 1
+    return stats
+
+
+def dedup_folder(input_dir, output_dir, threshold=0.8):
+    os.makedirs(output_dir, exist_ok=True)
+    index = NearDuplicateIndex(threshold)
+    totals = {"paragraphs": 0, "kept": 0, "exact": 0, "near": 0}
+    for filename in sorted(os.listdir(input_dir)):
+        if not filename.endswith(".jsonl"):
+            continue
+        stats = dedup_jsonl_file(index, os.path.join(input_dir, filename), os.path.join(output_dir, filename))
+        for name in totals:
+            totals[name] += stats[name]
+        print(f"{filename}: kept {stats['kept']}/{stats['paragraphs']} ({stats['exact']} exact, {stats['near']} near duplicates)")
+    index.write_provenance(os.path.join(output_dir, PROVENANCE_FILE))
+    return totals
+
+
+# Looks up every original (file, paragraph) occurrence of a kept paragraph, e.g. one
+# taken from an aligned triplet; paragraphs without duplicates map to nothing
+class ProvenanceMap:
+    def __init__(self, path):
+        self.records = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.records[record["key"]] = record
+
+    def occurrences(self, text):
+        record = self.records.get(text_key(text))
+        if record is None:
+            return []
+        return [record["kept"]] + record["duplicates"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Remove exact and near-duplicate paragraphs across a folder of JSONL files.")
+    parser.add_argument("input_dir", nargs="?", default="cleaned_jsonl/new")
+    parser.add_argument("output_dir", nargs="?", default="deduped_jsonl/new")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Estimated Jaccard similarity of near duplicates")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    totals = dedup_folder(args.input_dir, args.output_dir, args.threshold)
+    print(
+        f"\nKept {totals['kept']} of {totals['paragraphs']} paragraphs "
+        f"({totals['exact']} exact and {totals['near']} near duplicates removed); "
+        f"provenance in {os.path.join(args.output_dir, PROVENANCE_FILE)}"
+    )
@@ -0,0 +1,100 @@
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from metrics import metrics
+
+logger = logging.getLogger("ocr_executor")
+
+# HTTP / gRPC-mapped status codes worth retrying (quota exhausted, unavailable)
+RETRYABLE_CODES = {429, 503}
+
+
+class QuotaExceededError(Exception):
+    pass
+
+
+def is_retryable_error(exc):
+    if isinstance(exc, QuotaExceededError):
+        return True
+    code = getattr(exc, "code", None)
+    if callable(code):
+        # grpc errors expose code() instead of an attribute
+        return False
+    try:
+        return int(code) in RETRYABLE_CODES
+    except (TypeError, ValueError):
+        return False
+
+
+# Call fn(), retrying quota errors with full-jitter exponential backoff. Every attempt
+# is timed into remote_call_seconds{service=...} and every retry is counted.
+def call_with_retry(fn, max_retries=5, base_delay=1.0, max_delay=30.0, on_retry=None, service="documentai"):
+    attempt = 0
+    while True:
+        try:
+            with metrics.timer("remote_call_seconds", service=service):
+                return fn()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable_error(e):
+                metrics.inc("remote_errors_total", service=service)
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+            attempt += 1
+            metrics.inc("remote_retries_total", service=service)
+            logger.warning(f"Retryable OCR error ({e}); retry {attempt}/{max_retries} in {delay:.2f}s")
+            if on_retry is not None:
+                on_retry(e)
+            time.sleep(delay)
+
+
+# Run process_fn over chunks with at most max_in_flight requests outstanding.
+# Chunks are pulled lazily from the iterable and the texts come back in chunk order.
+class ConcurrentOCRExecutor:
+    def __init__(self, process_fn, max_in_flight=4, max_retries=5, base_delay=1.0, max_delay=30.0, service="documentai"):
+        self.process_fn = process_fn
+        self.service = service
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def _process(self, chunk):
+        return call_with_retry(
+            lambda: self.process_fn(chunk),
+            max_retries=self.max_retries,
+            base_delay=self.base_delay,
+            max_delay=self.max_delay,
+            service=self.service,
+        )
+
+    def map(self, chunks):
+        results = {}
+        chunks = iter(chunks)
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            pending = {}
+            submitted = 0
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < self.max_in_flight:
+                    try:
+                        chunk = next(chunks)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[pool.submit(self._process, chunk)] = submitted
+                    submitted += 1
+                metrics.set_gauge("remote_in_flight", len(pending), service=self.service)
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    try:
+                        results[index] = future.result()
+                    except Exception:
+                        for other in pending:
+                            other.cancel()
+                        raise
+        return [results[i] for i in range(len(results))]
@@ -0,0 +1,77 @@
+import io
+import logging
+from typing import Iterable, Iterator, Optional
+from PyPDF2 import PdfReader, PdfWriter
+
+logger = logging.getLogger("pdf_chunker")
+
+# Online Document AI requests are capped at 20 MB; keep some headroom for the request envelope
+MAX_CHUNK_BYTES = 18 * 1024 * 1024
+
+
+def write_pdf_pages(pdf_reader: PdfReader, page_nums) -> io.BytesIO:
+    pdf_writer = PdfWriter()
+    for page_num in page_nums:
+        pdf_writer.add_page(pdf_reader.pages[page_num])
+
+    chunk_stream = io.BytesIO()
+    pdf_writer.write(chunk_stream)
+    chunk_stream.seek(0)
+    return chunk_stream
+
+
+# Serialized size of a single page on its own; shared fonts/images are counted
+# for every page, so summing these over-estimates a chunk rather than under-estimating it
+def estimate_page_bytes(pdf_reader: PdfReader, page_num: int) -> int:
+    return write_pdf_pages(pdf_reader, [page_num]).getbuffer().nbytes
+
+
+# Serialize a page range, halving it if the real size still exceeds the byte limit
+def split_to_fit(pdf_reader: PdfReader, page_nums: list, max_chunk_bytes: int):
+    chunk_stream = write_pdf_pages(pdf_reader, page_nums)
+    if chunk_stream.getbuffer().nbytes <= max_chunk_bytes or len(page_nums) == 1:
+        logger.info(f"Processing pages {page_nums[0] + 1} to {page_nums[-1] + 1}...")
+        yield chunk_stream
+        return
+
+    del chunk_stream
+    middle = len(page_nums) // 2
+    yield from split_to_fit(pdf_reader, page_nums[:middle], max_chunk_bytes)
+    yield from split_to_fit(pdf_reader, page_nums[middle:], max_chunk_bytes)
+
+
+# Lazily split the PDF into chunks of at most chunk_size pages and max_chunk_bytes
+# bytes. Image-heavy scans get fewer pages per chunk, text-light PDFs are packed up
+# to the page limit. Only the chunk being built is held in memory. `pages` limits
+# the split to those 0-based page numbers; a chunk never spans a gap between them.
+def get_pdf_into_chunks(
+    pdf_path: str, chunk_size: int = 15, max_chunk_bytes: int = MAX_CHUNK_BYTES,
+    pages: Optional[Iterable[int]] = None
+) -> Iterator[io.BytesIO]:
+    # Open the PDF file
+    with open(pdf_path, "rb") as pdf_file:
+        pdf_reader = PdfReader(pdf_file)
+        total_page_num = len(pdf_reader.pages)
+
+        page_nums = []
+        estimated_bytes = 0
+        for page_num in (range(total_page_num) if pages is None else pages):
+            page_bytes = estimate_page_bytes(pdf_reader, page_num)
+            if page_nums and (
+                len(page_nums) >= chunk_size
+                or estimated_bytes + page_bytes > max_chunk_bytes
+                or page_num != page_nums[-1] + 1
+            ):
+                yield from split_to_fit(pdf_reader, page_nums, max_chunk_bytes)
+                page_nums, estimated_bytes = [], 0
+
+            page_nums.append(page_num)
+            estimated_bytes += page_bytes
+
+        if page_nums:
+            yield from split_to_fit(pdf_reader, page_nums, max_chunk_bytes)
+
+
+def get_pdf_page_count(pdf_path: str) -> int:
+    with open(pdf_path, "rb") as pdf_file:
+        return len(PdfReader(pdf_file).pages)
@@ -0,0 +1,353 @@
+import os
+import sys
+import json
+import queue
+import logging
+import argparse
+import threading
+import time
+from collections import defaultdict
+
+from metrics import metrics, export_metrics, profile_stage
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("pipeline")
+
+_DONE = object()
+
+
+# One pipeline stage: `workers` threads take items from a bounded input queue,
+# call fn(item) -> iterable of output items and put those on the next stage's
+# queue. A full downstream queue blocks the workers (back-pressure), so no
+# stage can run ahead and flood memory. finish_fn() -> iterable of items runs
+# once after the last input, for stateful stages that hold items back.
+# A failing item is counted and skipped; an error outside fn (e.g. in finish_fn)
+# is kept in `error` and still closes the next stage, so the pipeline never hangs.
+class Stage:
+    def __init__(self, name, fn, workers=1, queue_size=8, finish_fn=None):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.finish_fn = finish_fn
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.next = None
+        self.processed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.error = None
+        self._active = workers
+        self._lock = threading.Lock()
+
+    def put(self, item):
+        self.queue.put(item)
+        self._record_depth()
+
+    def _record_depth(self):
+        depth = self.queue.qsize()
+        metrics.set_gauge("queue_depth", depth, stage=self.name)
+        if depth > self.max_depth:
+            self.max_depth = depth
+            metrics.set_gauge("queue_depth_max", depth, stage=self.name)
+
+    def _emit(self, items):
+        if self.next is None or items is None:
+            return
+        for item in items:
+            self.next.put(item)
+
+    def _work(self):
+        try:
+            with profile_stage(self.name):
+                self._work_loop()
+        except Exception as e:
+            self._record_error(e)
+            # Keep taking items so the upstream never blocks on this queue
+            while self.queue.get() is not _DONE:
+                pass
+        finally:
+            self._finish_worker()
+
+    def _record_error(self, error):
+        logger.error(f"[{self.name}] stage error: {error}")
+        metrics.inc("stage_errors_total", stage=self.name)
+        with self._lock:
+            if self.error is None:
+                self.error = error
+
+    def _work_loop(self):
+        while True:
+            item = self.queue.get()
+            self._record_depth()
+            if item is _DONE:
+                break
+            start = time.perf_counter()
+            try:
+                self._emit(self.fn(item))
+                with self._lock:
+                    self.processed += 1
+            except Exception as e:
+                logger.error(f"[{self.name}] failed on {item!r:.120}: {e}")
+                with self._lock:
+                    self.failed += 1
+                metrics.inc("stage_failures_total", stage=self.name)
+            # Includes time blocked on a full downstream queue
+            metrics.observe("stage_item_seconds", time.perf_counter() - start, stage=self.name)
+
+    def _finish_worker(self):
+        with self._lock:
+            self._active -= 1
+            last_worker = self._active == 0
+        if not last_worker:
+            return
+        try:
+            if self.finish_fn is not None:
+                self._emit(self.finish_fn())
+        except Exception as e:
+            self._record_error(e)
+        finally:
+            if self.next is not None:
+                self.next.close()
+
+    # Called once the upstream has no more items
+    def close(self):
+        for _ in range(self.workers):
+            self.queue.put(_DONE)
+
+    def start(self):
+        threads = [
+            threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        return threads
+
+
+class Pipeline:
+    def __init__(self, stages):
+        self.stages = stages
+        for upstream, downstream in zip(stages, stages[1:]):
+            upstream.next = downstream
+
+    # Per-stage counts; re-raises the first stage error once every stage has stopped
+    def run(self, items):
+        threads = [thread for stage in self.stages for thread in stage.start()]
+        try:
+            for item in items:
+                self.stages[0].put(item)
+        finally:
+            self.stages[0].close()
+            for thread in threads:
+                thread.join()
+        for stage in self.stages:
+            if stage.error is not None:
+                raise stage.error
+        return {
+            stage.name: {"processed": stage.processed, "failed": stage.failed, "max_queue_depth": stage.max_depth}
+            for stage in self.stages
+        }
+
+
+# Holds cleaned files back until all three languages of a "<base>-e/t/s" group are present
+class GroupCollector:
+    def __init__(self, languages=("e", "t", "s")):
+        self.languages = languages
+        self.groups = defaultdict(dict)
+
+    def add(self, path):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if "-" not in stem:
+            logger.warning(f"Skipping {path}: missing '-<lang>' suffix")
+            return []
+        base, lang = stem.rsplit("-", 1)
+        if lang not in self.languages:
+            logger.warning(f"Skipping {path}: invalid language code '{lang}'")
+            return []
+        self.groups[base][lang] = path
+        if all(code in self.groups[base] for code in self.languages):
+            return [(base, self.groups.pop(base))]
+        return []
+
+    def finish(self):
+        for base in self.groups:
+            logger.warning(f"Skipping {base}: missing one or more language files")
+        return []
+
+
+# Extraction stage: PDF -> raw JSONL paragraphs, via Gemini or Document AI
+def make_extract_fn(args, raw_dir):
+    from manifest import ProcessingManifest
+    manifest = ProcessingManifest.for_directory(raw_dir)
+
+    if args.extractor == "gemini":
+        import filehandler
+        extractor = filehandler.make_sharded_extractor(args.shard_size, args.shard_concurrency) if args.sharded else None
+
+        def extract(pdf_path):
+            output_path = os.path.join(raw_dir, os.path.splitext(os.path.basename(pdf_path))[0] + ".jsonl")
+            if filehandler.extract_pdf_file(pdf_path, output_path, manifest, args.start_page, extractor=extractor,
+                                            expected_script=args.expected_script):
+                return [output_path]
+            return []
+        return extract
+
+    import document_ai
+    from text_layer import page_texts_to_jsonl
+
+    def extract(pdf_path):
+        output_path = os.path.join(raw_dir, os.path.splitext(os.path.basename(pdf_path))[0] + ".jsonl")
+        job_hash = document_ai.ocr_job_hash(pdf_path, 15, document_ai.MAX_CHUNK_BYTES, True, args.expected_script)
+        if manifest.is_complete(document_ai.OCR_STAGE, pdf_path, job_hash) and os.path.exists(output_path):
+            return [output_path]
+
+        manifest.start(document_ai.OCR_STAGE, pdf_path, job_hash)
+        try:
+            text = document_ai.process_large_pdf(pdf_path, expected_script=args.expected_script,
+                                                 manifest=manifest, job_hash=job_hash)
+        except Exception as e:
+            manifest.fail(document_ai.OCR_STAGE, pdf_path, e)
+            raise
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(page_texts_to_jsonl([text]))
+        manifest.complete(document_ai.OCR_STAGE, pdf_path)
+        return [output_path]
+    return extract
+
+
+def make_clean_fn(cleaned_dir):
+    from fix_jsonl import clean_jsonl_file
+
+    def clean(raw_path):
+        output_path = os.path.join(cleaned_dir, os.path.basename(raw_path))
+        stats = clean_jsonl_file(raw_path, output_path)
+        logger.info(f"Cleaned {os.path.basename(raw_path)}: {stats['repaired']} repaired, {stats['escalated']} escalated")
+        return [output_path]
+    return clean
+
+
+# Corpus-wide near-duplicate removal; one worker, since the LSH index is shared state
+def make_dedup_fns(deduped_dir, threshold):
+    from near_dedup import NearDuplicateIndex, PROVENANCE_FILE, dedup_jsonl_file
+    index = NearDuplicateIndex(threshold)
+
+    def dedup(cleaned_path):
+        output_path = os.path.join(deduped_dir, os.path.basename(cleaned_path))
+        stats = dedup_jsonl_file(index, cleaned_path, output_path)
+        logger.info(f"Deduplicated {os.path.basename(cleaned_path)}: kept {stats['kept']}/{stats['paragraphs']}")
+        return [output_path]
+
+    def finish():
+        index.write_provenance(os.path.join(deduped_dir, PROVENANCE_FILE))
+        return []
+    return dedup, finish
+
+
+def make_filter_fns(output_file, thresholds):
+    from filter_and_join_json import filter_file, triplet_digest
+    seen = set()
+    out = open(output_file, "w", encoding="utf-8")
+
+    def filter_aligned(aligned_path):
+        _, _, kept, _ = filter_file(aligned_path, thresholds)
+        for entry in kept:
+            digest = triplet_digest(entry)
+            if digest not in seen:
+                seen.add(digest)
+                out.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        out.flush()
+        return []
+
+    def finish():
+        out.close()
+        logger.info(f"Wrote {len(seen)} filtered triplets to {output_file}")
+        return []
+    return filter_aligned, finish
+
+
+def build_pipeline(args):
+    raw_dir = os.path.join(args.work_dir, "raw")
+    cleaned_dir = os.path.join(args.work_dir, "cleaned")
+    deduped_dir = os.path.join(args.work_dir, "deduped")
+    aligned_dir = os.path.join(args.work_dir, "aligned")
+    for directory in (raw_dir, cleaned_dir, deduped_dir, aligned_dir):
+        os.makedirs(directory, exist_ok=True)
+
+    # Encodes through the warm embedding server when it runs, else loads e5 once in-process
+    import sentence_pair_multiligual_embeddings as e5
+
+    collector = GroupCollector()
+    filter_aligned, finish_filter = make_filter_fns(
+        os.path.join(args.work_dir, "filtered_output.jsonl"),
+        {"eng_tam": args.threshold, "eng_sin": args.threshold, "tam_sin": args.threshold},
+    )
+
+    def embed(group):
+        base_name, paths = group
+        sentences, embeddings = e5.encode_group(paths)
+        return [(base_name, sentences, embeddings)]
+
+    def align(encoded):
+        base_name, sentences, embeddings = encoded
+        return [e5.align_encoded_group(base_name, sentences, embeddings, aligned_dir, output_format=args.output_format)]
+
+    def finish_align():
+        e5.print_cache_stats()
+        return []
+
+    q = args.queue_size
+    stages = [
+        Stage("extract", make_extract_fn(args, raw_dir), workers=args.extract_workers, queue_size=q),
+        Stage("clean", make_clean_fn(cleaned_dir), workers=args.clean_workers, queue_size=q),
+    ]
+    if args.dedup_threshold > 0:
+        dedup, finish_dedup = make_dedup_fns(deduped_dir, args.dedup_threshold)
+        stages.append(Stage("dedup", dedup, workers=1, queue_size=q, finish_fn=finish_dedup))
+    return Pipeline(stages + [
+        Stage("group", collector.add, workers=1, queue_size=q, finish_fn=collector.finish),
+        Stage("embed", embed, workers=args.embed_workers, queue_size=q),
+        Stage("align", align, workers=args.align_workers, queue_size=q, finish_fn=finish_align),
+        Stage("filter", filter_aligned, workers=1, queue_size=q, finish_fn=finish_filter),
+    ])
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run extraction, cleanup, embedding, alignment and filtering as one pipeline.")
+    parser.add_argument("--input-dir", default="documents/New", help="Folder with the PDFs to process")
+    parser.add_argument("--work-dir", default="pipeline_output", help="Folder for the intermediate and final outputs")
+    parser.add_argument("--extractor", choices=("gemini", "documentai"), default="gemini")
+    parser.add_argument("--start-page", type=int, default=1)
+    parser.add_argument("--expected-script", choices=("en", "ta", "si"),
+                        help="Language of the input PDFs, used to reject legacy-font text layers "
+                             "(default: the -e/-t/-s file name suffix)")
+    parser.add_argument("--sharded", action="store_true", help="Use sharded, concurrent Gemini extraction")
+    parser.add_argument("--shard-size", type=int, default=10)
+    parser.add_argument("--shard-concurrency", type=int, default=4)
+    parser.add_argument("--extract-workers", type=int, default=4)
+    parser.add_argument("--clean-workers", type=int, default=2)
+    parser.add_argument("--embed-workers", type=int, default=1)
+    parser.add_argument("--align-workers", type=int, default=1)
+    parser.add_argument("--output-format", choices=("json", "columnar"), default="json",
+                        help="Aligned triplets as JSON files or memory-mapped columnar stores")
+    parser.add_argument("--queue-size", type=int, default=8, help="Capacity of the queue in front of each stage")
+    parser.add_argument("--dedup-threshold", type=float, default=0.0,
+                        help="Drop paragraphs this similar to an earlier one before embedding, e.g. 0.8 "
+                             "(default 0: off). Lossy and per language, so parallel documents can lose "
+                             "different paragraphs, which breaks banded alignment")
+    parser.add_argument("--threshold", type=float, default=0.85)
+    parser.add_argument("--metrics-prom", help="Write metrics in Prometheus text format to this file")
+    parser.add_argument("--metrics-json", help="Write a JSON metrics snapshot to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    pdf_paths = sorted(
+        os.path.join(args.input_dir, f) for f in os.listdir(args.input_dir) if f.lower().endswith(".pdf")
+    )
+    print(f"Found {len(pdf_paths)} PDF files in {args.input_dir}.")
+
+    stats = build_pipeline(args).run(pdf_paths)
+    for name, counts in stats.items():
+        print(f"{name:>8}: {counts['processed']} processed, {counts['failed']} failed, max queue {counts['max_queue_depth']}")
+    export_metrics(args.metrics_prom, args.metrics_json)
+    sys.exit(1 if any(counts["failed"] for counts in stats.values()) else 0)
@@ -0,0 +1,40 @@
+import numpy as np
+
+# How embeddings are stored and compared: full precision, half precision, or
+# int8 with one float32 scale per vector (v ≈ q * scale)
+STORAGE_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+
+def check_storage(storage):
+    if storage not in STORAGE_DTYPES:
+        raise ValueError(f"Unknown embedding storage '{storage}', expected one of {tuple(STORAGE_DTYPES)}")
+
+
+# Returns (quantized vectors, per-vector scales); scales is None unless storage is int8
+def quantize(vectors, storage):
+    check_storage(storage)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if storage != "int8":
+        return vectors.astype(STORAGE_DTYPES[storage]), None
+    scales = np.abs(vectors).max(axis=-1) / 127.0
+    scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+    q = np.clip(np.rint(vectors / scales[..., None]), -127, 127).astype(np.int8)
+    return q, scales
+
+
+def dequantize(q, scales=None):
+    vectors = np.asarray(q, dtype=np.float32)
+    if scales is not None:
+        vectors = vectors * np.asarray(scales, dtype=np.float32)[..., None]
+    return vectors
+
+
+# a @ b.T for quantized inputs, widened to float32 one block of rows at a time so
+# only the quantized copies and the result are held in full
+def quantized_similarity(a_q, a_scales, b_q, b_scales, row_block=4096):
+    b = dequantize(b_q, b_scales)
+    sims = np.empty((len(a_q), len(b_q)), dtype=np.float32)
+    for r0 in range(0, len(a_q), row_block):
+        a = dequantize(a_q[r0:r0 + row_block], None if a_scales is None else a_scales[r0:r0 + row_block])
+        sims[r0:r0 + len(a)] = a @ b.T
+    return sims
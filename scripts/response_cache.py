@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import hashlib
+import logging
+
+from metrics import metrics
+
+logger = logging.getLogger("response_cache")
+
+# use: read and write the cache, bypass: ignore it entirely, refresh: always call and overwrite
+CACHE_MODES = ("use", "bypass", "refresh")
+
+
+def sha256_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_text(text):
+    return sha256_bytes(text.encode("utf-8"))
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Key of one LLM response: (input content hash, page range, prompt text hash, model name)
+def response_key(content_hash, page_range, prompt, model_name):
+    page_part = "" if page_range is None else f"{page_range[0]}-{page_range[1]}"
+    payload = "\x1f".join([content_hash, page_part, sha256_text(prompt), model_name])
+    return sha256_text(payload)
+
+
+# Local response store, one JSON file per key. Entries older than ttl_seconds are
+# treated as misses; the least recently used files are evicted above max_bytes.
+class ResponseCache:
+    def __init__(self, cache_dir, ttl_seconds=30 * 24 * 3600, max_bytes=512 * 1024 * 1024, mode="use"):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode '{mode}', expected one of {CACHE_MODES}")
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        if self.mode != "use":
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+
+        if time.time() - entry["created"] > self.ttl_seconds:
+            os.remove(path)
+            self.misses += 1
+            return None
+
+        # Touch the file so eviction sees it as recently used
+        os.utime(path)
+        self.hits += 1
+        return entry["response"]
+
+    def put(self, key, response, **metadata):
+        if self.mode == "bypass":
+            return
+        entry = {"created": time.time(), "response": response, **metadata}
+        path = self._path(key)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    # Return the cached response for key, or call fn() and store a non-empty result
+    def get_or_call(self, key, fn, **metadata):
+        cached = self.get(key)
+        if cached is not None:
+            logger.info(f"Response cache hit ({key[:12]})")
+            metrics.inc("response_cache_requests_total", result="hit")
+            return cached
+
+        metrics.inc("response_cache_requests_total", result="miss")
+
+        response = fn()
+        if response:
+            self.put(key, response, **metadata)
+        return response
@@ -1,65 +1,66 @@
 import os
 import json
 from collections import defaultdict
-from sentence_transformers import SentenceTransformer, util
-import torch
-
-# Load multilingual model
-model = SentenceTransformer("intfloat/multilingual-e5-base")
-
-# Load sentences from JSONL
-def load_jsonl_sentences(filepath):
-    sentences = []
-    with open(filepath, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                obj = json.loads(line)
-                text = obj.get("paragraph_content") or obj.get("paragraph") or obj.get("text", "")
-                text = text.strip()
-
-                if text:
-                    sentences.append(text)
-            except json.JSONDecodeError as e:
-                print(f"⚠️ Skipping invalid line in {filepath}: {e}")
-    return sentences
-
-# Encode with prefix
-def encode_with_prefix(sentences):
-    return model.encode([f"query: {s}" for s in sentences], convert_to_tensor=True)
+from alignment_engine import align_triplets
+from embedding_cache import EmbeddingCache, encode_cached
+from embedding_client import encode_e5
+from jsonl_io import load_jsonl_sentences
+from metrics import export_metrics, profile_stage
+from triplet_store import STORE_SUFFIX, write_triplet_store
+
+# Multilingual model; it stays loaded in embedding_server.py when that is running,
+# otherwise it is loaded in this process on first use
+MODEL_NAME = "intfloat/multilingual-e5-base"
+
+# How embeddings are stored and compared: "float32", "float16" or "int8" (per-vector
+# scale). None keeps the format the cache was created with and compares in float32.
+EMBEDDING_STORAGE = None
+
+# Persistent embedding store; only paragraphs missing from it are encoded
+embedding_cache = EmbeddingCache("embedding_cache/e5", storage=EMBEDDING_STORAGE)
+
+# Encode with prefix (unit-length vectors, so cosine similarity is a dot product)
+def encode_with_prefix(sentences, prefix="query: "):
+    return encode_cached(embedding_cache, sentences, lambda texts: encode_e5(texts, prefix), MODEL_NAME, prefix)
 
 # Directory with input files
 input_dir = "cleaned_jsonl/new"
 
-# Group files by base name
-file_groups = defaultdict(dict)
-
-for filename in os.listdir(input_dir):
-    if not filename.endswith(".jsonl"):
-        continue
-    if "-" not in filename:
-        print(f"⚠️ Skipping file (missing '-'): {filename}")
-        continue
-    try:
-        base, lang_ext = filename.rsplit("-", 1)
-        lang = lang_ext.replace(".jsonl", "")
-        if lang in {"e", "t", "s"}:
-            file_groups[base][lang] = os.path.join(input_dir, filename)
-        else:
-            print(f"⚠️ Skipping file (invalid language code): {filename}")
-    except Exception as e:
-        print(f"⚠️ Error processing file {filename}: {e}")
-
-# Process each file group
-for base_name, paths in file_groups.items():
-    if not all(lang in paths for lang in ("e", "t", "s")):
-        print(f"⚠️ Skipping {base_name}: missing one or more language files")
-        continue
-
-    print(f"\n📄 Processing group: {base_name}")
+# One-to-one matching strategy: "global_greedy", "optimal" (needs scipy) or
+# "row_greedy" to reproduce the original English-row-order results; "banded"
+# follows document order and can merge split paragraphs
+ALIGNMENT_MODE = "global_greedy"
+
+# "json" writes aligned_triplets_<base>.json; "columnar" writes a memory-mapped
+# aligned_triplets_<base>.tstore directory (see triplet_store.py), with the
+# triplets' embeddings as well when STORE_EMBEDDINGS is set
+OUTPUT_FORMAT = "json"
+STORE_EMBEDDINGS = False
 
+# Group files by base name
+def group_input_files(input_dir):
+    file_groups = defaultdict(dict)
+
+    for filename in os.listdir(input_dir):
+        if not filename.endswith(".jsonl"):
+            continue
+        if "-" not in filename:
+            print(f"⚠️ Skipping file (missing '-'): {filename}")
+            continue
+        try:
+            base, lang_ext = filename.rsplit("-", 1)
+            lang = lang_ext.replace(".jsonl", "")
+            if lang in {"e", "t", "s"}:
+                file_groups[base][lang] = os.path.join(input_dir, filename)
+            else:
+                print(f"⚠️ Skipping file (invalid language code): {filename}")
+        except Exception as e:
+            print(f"⚠️ Error processing file {filename}: {e}")
+
+    return file_groups
+
+# Load and encode the three language files of one group
+def encode_group(paths):
     english_sentences = load_jsonl_sentences(paths["e"])
     tamil_sentences = load_jsonl_sentences(paths["t"])
     sinhala_sentences = load_jsonl_sentences(paths["s"])
@@ -69,53 +70,54 @@ for base_name, paths in file_groups.items():
     tam_embeddings = encode_with_prefix(tamil_sentences)
     sin_embeddings = encode_with_prefix(sinhala_sentences)
 
-    aligned_triplets = []
-    used_tam = set()
-    used_sin = set()
-
-    print("🔍 Mapping sentences with highest similarity...")
-
-    for i, eng_emb in enumerate(eng_embeddings):
-        eng_text = english_sentences[i]
-
-        # English–Tamil similarity
-        sim_et = util.pytorch_cos_sim(eng_emb, tam_embeddings)[0]
-        for idx in used_tam:
-            sim_et[idx] = -1
-        best_et_idx = torch.argmax(sim_et).item()
-        best_et_score = sim_et[best_et_idx].item()
-        tam_text = tamil_sentences[best_et_idx]
-        tam_emb = tam_embeddings[best_et_idx]
-
-        # Sinhala similarity (average of English-Sinhala and Tamil-Sinhala)
-        sim_es = util.pytorch_cos_sim(eng_emb, sin_embeddings)[0]
-        sim_ts = util.pytorch_cos_sim(tam_emb, sin_embeddings)[0]
-        combined_sim = (sim_es + sim_ts) / 2.0
-        for idx in used_sin:
-            combined_sim[idx] = -1
-        best_es_idx = torch.argmax(combined_sim).item()
-        best_es_score = sim_es[best_es_idx].item()
-        best_ts_score = sim_ts[best_es_idx].item()
-        sin_text = sinhala_sentences[best_es_idx]
-
-        aligned_triplets.append({
-            "english": eng_text,
-            "tamil": tam_text,
-            "sinhala": sin_text,
-            "similarity": {
-                "eng_tam": round(best_et_score, 4),
-                "eng_sin": round(best_es_score, 4),
-                "tam_sin": round(best_ts_score, 4),
-                "combined_avg": round((best_et_score + best_es_score + best_ts_score) / 3, 4)
-            }
-        })
-
-        used_tam.add(best_et_idx)
-        used_sin.add(best_es_idx)
+    sentences = (english_sentences, tamil_sentences, sinhala_sentences)
+    embeddings = (eng_embeddings, tam_embeddings, sin_embeddings)
+    return sentences, embeddings
+
+# Align an encoded group and save its aligned triplets; returns the output path
+def align_encoded_group(base_name, sentences, embeddings, output_dir=".", mode=None, output_format=None):
+    mode = mode or ALIGNMENT_MODE
+    output_format = output_format or OUTPUT_FORMAT
+    print(f"🔍 Mapping sentences with highest similarity ({mode})...")
+    aligned_triplets = align_triplets(*sentences, *embeddings, mode=mode, precision=EMBEDDING_STORAGE or "float32")
 
     # Save aligned triplets
-    output_path = f"aligned_triplets_{base_name}.json"
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(aligned_triplets, f, ensure_ascii=False, indent=2)
+    if output_format == "columnar":
+        output_path = os.path.join(output_dir, f"aligned_triplets_{base_name}{STORE_SUFFIX}")
+        triplet_embeddings = None
+        if STORE_EMBEDDINGS:
+            # Cache hits for unmerged paragraphs; merged ones (banded mode) are encoded here
+            triplet_embeddings = [
+                encode_with_prefix([r[column] for r in aligned_triplets])
+                for column in ("english", "tamil", "sinhala")
+            ]
+        write_triplet_store(output_path, aligned_triplets, triplet_embeddings)
+    else:
+        output_path = os.path.join(output_dir, f"aligned_triplets_{base_name}.json")
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(aligned_triplets, f, ensure_ascii=False, indent=2)
 
     print(f"✅ Saved {len(aligned_triplets)} aligned triplets to '{output_path}'")
+    return output_path
+
+def print_cache_stats():
+    embedding_cache.save()
+    cache_stats = embedding_cache.stats()
+    print(f"\n💾 Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses ({cache_stats['entries']} stored)")
+
+if __name__ == "__main__":
+    # Process each file group
+    for base_name, paths in group_input_files(input_dir).items():
+        if not all(lang in paths for lang in ("e", "t", "s")):
+            print(f"⚠️ Skipping {base_name}: missing one or more language files "
+                  f"(mine_parallel_candidates.py searches the whole corpus for its translations)")
+            continue
+
+        print(f"\n📄 Processing group: {base_name}")
+        with profile_stage("embed"):
+            sentences, embeddings = encode_group(paths)
+        with profile_stage("align"):
+            align_encoded_group(base_name, sentences, embeddings)
+
+    print_cache_stats()
+    export_metrics()
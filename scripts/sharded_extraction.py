@@ -0,0 +1,130 @@
+import os
+import asyncio
+import logging
+import tempfile
+from PyPDF2 import PdfReader, PdfWriter
+from metrics import metrics
+from response_cache import file_sha256, response_key
+
+logger = logging.getLogger("sharded_extraction")
+
+
+# Inclusive 1-based page windows covering start_page..end_page
+def page_windows(start_page, end_page, shard_size):
+    return [
+        (first, min(first + shard_size - 1, end_page))
+        for first in range(start_page, end_page + 1, shard_size)
+    ]
+
+
+def write_page_window(pdf_path, start_page, end_page, output_path):
+    reader = PdfReader(pdf_path)
+    writer = PdfWriter()
+    for page_num in range(start_page - 1, end_page):
+        writer.add_page(reader.pages[page_num])
+    with open(output_path, "wb") as f:
+        writer.write(f)
+
+
+# Upload only pages first..last of pdf_path and run generate_fn(prompt, window_pdf_path)
+# on them; the temporary window PDF is removed afterwards. Shared by the sharded and
+# the single-range (filehandler.extract_pdf_with_ai) extraction paths.
+def generate_for_window(generate_fn, prompt, pdf_path, first, last):
+    logger.info(f"Extracting {os.path.basename(pdf_path)} [{first}-{last}]")
+    fd, window_path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        write_page_window(pdf_path, first, last, window_path)
+        metrics.inc("remote_pages_total", last - first + 1, service="gemini")
+        metrics.inc("remote_bytes_sent_total", os.path.getsize(window_path), service="gemini")
+        with metrics.timer("remote_call_seconds", service="gemini"):
+            return generate_fn(prompt, window_path)
+    finally:
+        os.remove(window_path)
+
+
+class ShardExtractionError(Exception):
+    def __init__(self, pdf_path, failed_windows):
+        self.pdf_path = pdf_path
+        self.failed_windows = failed_windows
+        pages = ", ".join(f"{first}-{last}" for first, last in failed_windows)
+        super().__init__(f"Shard extraction failed for {pdf_path} (pages {pages})")
+
+
+# Concatenate per-shard JSONL output in page order
+def merge_jsonl_shards(shard_texts):
+    return "\n".join(text.strip() for text in shard_texts if text and text.strip())
+
+
+# Splits each PDF into page windows, uploads only those pages and extracts the
+# windows concurrently. generate_fn(prompt, shard_pdf_path) does the model call
+# (Gemini in filehandler.py, StubGeminiModel.generate offline) and runs in a
+# worker thread; at most `concurrency` shards are in flight across all PDFs.
+# A PDF is only returned when every one of its shards succeeded; otherwise its
+# result is None, and the shards that did succeed stay in the response cache for the retry.
+class ShardedExtractor:
+    def __init__(self, generate_fn, prompt_fn, shard_size=10, concurrency=4, cache=None, model_name="gemini-2.0-flash"):
+        self.generate_fn = generate_fn
+        self.prompt_fn = prompt_fn
+        self.shard_size = shard_size
+        self.concurrency = concurrency
+        self.cache = cache
+        self.model_name = model_name
+
+    def _extract_shard(self, pdf_path, content_hash, window):
+        first, last = window
+        # The uploaded shard only holds the window, so its pages are numbered from 1
+        prompt = self.prompt_fn(1, last - first + 1)
+
+        def generate():
+            return generate_for_window(self.generate_fn, prompt, pdf_path, first, last)
+
+        try:
+            if self.cache is None:
+                return generate()
+            key = response_key(content_hash, window, prompt, self.model_name)
+            return self.cache.get_or_call(key, generate, model=self.model_name, source=os.path.basename(pdf_path))
+        except Exception as e:
+            logger.error(f"Shard extraction failed for {pdf_path} [{first}-{last}]: {e}")
+            raise
+
+    async def _extract_shard_async(self, semaphore, pdf_path, content_hash, window):
+        async with semaphore:
+            return await asyncio.to_thread(self._extract_shard, pdf_path, content_hash, window)
+
+    async def extract_pdf(self, pdf_path, start_page, end_page, semaphore=None):
+        semaphore = semaphore or asyncio.Semaphore(self.concurrency)
+        content_hash = await asyncio.to_thread(file_sha256, pdf_path)
+        windows = page_windows(start_page, end_page, self.shard_size)
+        # Every shard runs to completion before a failure is raised, so none of them is wasted
+        shard_texts = await asyncio.gather(
+            *(self._extract_shard_async(semaphore, pdf_path, content_hash, window) for window in windows),
+            return_exceptions=True,
+        )
+        failed = [window for window, text in zip(windows, shard_texts) if isinstance(text, Exception)]
+        if failed:
+            metrics.inc("shard_failures_total", len(failed))
+            raise ShardExtractionError(pdf_path, failed)
+        return merge_jsonl_shards(shard_texts)
+
+    async def _extract_job(self, semaphore, job_index, job, on_result):
+        try:
+            text = await self.extract_pdf(*job, semaphore=semaphore)
+        except ShardExtractionError as e:
+            logger.error(str(e))
+            text = None
+        if on_result is not None:
+            on_result(job_index, text)
+        return text
+
+    # jobs: iterable of (pdf_path, start_page, end_page); returns texts in job order,
+    # None for a job with a failed shard. on_result(job_index, text) is called as soon
+    # as each job finishes.
+    async def extract_many(self, jobs, on_result=None):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        return await asyncio.gather(
+            *(self._extract_job(semaphore, i, job, on_result) for i, job in enumerate(jobs))
+        )
+
+    def run(self, jobs, on_result=None):
+        return asyncio.run(self.extract_many(list(jobs), on_result))
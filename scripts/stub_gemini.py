@@ -0,0 +1,28 @@
+import json
+import random
+import threading
+import time
+from PyPDF2 import PdfReader
+
+
+# Offline stand-in for the Gemini extraction call: sleeps for the injected latency,
+# then returns one JSONL paragraph per page of the uploaded PDF.
+class StubGeminiModel:
+    def __init__(self, latency=0.5, jitter=0.1):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt, pdf_path):
+        with self._lock:
+            self.calls += 1
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+        reader = PdfReader(pdf_path)
+        lines = []
+        for page in reader.pages:
+            text = (page.extract_text() or "").strip()
+            if text:
+                lines.append(json.dumps({"paragraph": text}, ensure_ascii=False))
+        return "\n".join(lines)
@@ -1,18 +1,16 @@
-from sentence_transformers import SentenceTransformer, util
+from embedding_client import encode_e5
 
-# Load the multilingual model
-model = SentenceTransformer("intfloat/multilingual-e5-base")
+# The multilingual e5 model is served by embedding_server.py when it is running
 
 english = "The lion roared loudly in the jungle."
 tamil = "நான் இப்போது பாஸ்தாவை சமைக்கிறேன்."  # I'm cooking pasta now.
 sinhala = "අපි හෙට පසුගිය වසරේ වාර්තාවක් ඉදිරිපත් කරනවා."  # We are presenting last year's report tomorrow.
 
-# Add E5-specific prefix
-inputs = [f"query: {s}" for s in [english, tamil, sinhala]]
-embeddings = model.encode(inputs, convert_to_tensor=True)
+# Encode with the E5-specific prefix (unit-length vectors)
+embeddings = encode_e5([english, tamil, sinhala], prefix="query: ")
 
 # Calculate cosine similarity matrix
-sim_matrix = util.pytorch_cos_sim(embeddings, embeddings)
+sim_matrix = embeddings @ embeddings.T
 
 # Extract scores
 sim_et = float(sim_matrix[0][1])  # English–Tamil
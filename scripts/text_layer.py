@@ -0,0 +1,165 @@
+import os
+import re
+import json
+import logging
+from PyPDF2 import PdfReader
+
+from text_normalize import iter_normalized
+
+# Unicode blocks used to check that a text layer really is Tamil / Sinhala
+SCRIPT_RANGES = {
+    "ta": (0x0B80, 0x0BFF),
+    "si": (0x0D80, 0x0DFF),
+}
+FILENAME_SCRIPT_HINTS = {"e": "en", "t": "ta", "s": "si"}
+
+logger = logging.getLogger("text_layer")
+
+MIN_PAGE_CHARS = 20
+MAX_BAD_CHAR_RATIO = 0.02
+MIN_SCRIPT_RATIO = 0.3
+MAX_LEGACY_LATIN_RATIO = 0.2
+
+CID_PATTERN = re.compile(r"\(cid:\d+\)")
+# Tamil (e, ee, ai) and Sinhala (e, ee, ai) vowel signs are written before their consonant
+# but stored after it; a word starting with one means the layer is in visual order
+VISUAL_ORDER_PATTERN = re.compile(r"(?:^|[\s(\[\"'\u2018\u201c])[\u0BC6-\u0BC8\u0DD9-\u0DDB]")
+
+
+# Language of a file following the "<base>-e/t/s" naming convention, if any
+def script_hint_from_filename(filename):
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    if "-" not in stem:
+        return None
+    return FILENAME_SCRIPT_HINTS.get(stem.rsplit("-", 1)[1].lower())
+
+
+def _is_bad_char(c):
+    code = ord(c)
+    return (
+        c == "�"
+        or 0xE000 <= code <= 0xF8FF
+        or (code < 0x20 and c not in "\n\t\r")
+    )
+
+
+# "text": usable embedded text, "scanned": no text layer (image-only page),
+# "broken": a text layer that must not be trusted (CID glyph codes, private-use
+# or replacement characters, legacy Tamil/Sinhala fonts that map glyphs onto
+# Latin code points, or Tamil/Sinhala stored in visual rather than logical order)
+def classify_page_text(text, expected_script=None):
+    text = text or ""
+    visible = "".join(text.split())
+    if len(visible) < MIN_PAGE_CHARS:
+        return "scanned"
+
+    cid_chars = sum(len(m) for m in CID_PATTERN.findall(visible))
+    bad_chars = sum(1 for c in visible if _is_bad_char(c))
+    if (cid_chars + bad_chars) / len(visible) > MAX_BAD_CHAR_RATIO:
+        return "broken"
+
+    letters = [c for c in visible if c.isalpha()]
+    if not letters:
+        return "broken"
+
+    legacy_latin = sum(1 for c in letters if 0x00C0 <= ord(c) <= 0x024F)
+    if legacy_latin / len(letters) > MAX_LEGACY_LATIN_RATIO:
+        return "broken"
+
+    if VISUAL_ORDER_PATTERN.search(text):
+        return "broken"
+
+    if expected_script in SCRIPT_RANGES:
+        low, high = SCRIPT_RANGES[expected_script]
+        in_script = sum(1 for c in letters if low <= ord(c) <= high)
+        if in_script / len(letters) < MIN_SCRIPT_RATIO:
+            return "broken"
+    elif expected_script == "en":
+        ascii_letters = sum(1 for c in letters if c.isascii())
+        if ascii_letters / len(letters) < 1 - MIN_SCRIPT_RATIO:
+            return "broken"
+
+    return "text"
+
+
+def _pdfplumber_page_texts(pdf_path, page_numbers):
+    import pdfplumber
+    with pdfplumber.open(pdf_path) as pdf:
+        return {n: pdf.pages[n].extract_text() or "" for n in page_numbers}
+
+
+# PyPDF2 reads a born-digital page in about a millisecond, pdfplumber takes over a
+# hundred; pdfplumber is only used for pages (or files) PyPDF2 cannot read
+def extract_page_texts(pdf_path, start_page=1, end_page=None):
+    try:
+        reader = PdfReader(pdf_path)
+        end_page = len(reader.pages) if end_page is None else end_page
+    except Exception as e:
+        logger.warning(f"PyPDF2 could not open {pdf_path} ({e}); using pdfplumber")
+        import pdfplumber
+        with pdfplumber.open(pdf_path) as pdf:
+            end_page = len(pdf.pages) if end_page is None else end_page
+            return [pdf.pages[n].extract_text() or "" for n in range(start_page - 1, end_page)]
+
+    texts = {}
+    failed = []
+    for n in range(start_page - 1, end_page):
+        try:
+            texts[n] = reader.pages[n].extract_text() or ""
+        except Exception:
+            failed.append(n)
+    if failed:
+        logger.warning(f"PyPDF2 could not read {len(failed)} page(s) of {pdf_path}; using pdfplumber for them")
+        texts.update(_pdfplumber_page_texts(pdf_path, failed))
+    return [texts[n] for n in range(start_page - 1, end_page)]
+
+
+# Group pages start_page..end_page (1-based, inclusive) into consecutive runs:
+#   ("local", first, last, [page texts]) for pages with a usable text layer
+#   ("remote", first, last, None) for pages that need OCR / the LLM extractor
+def plan_page_segments(pdf_path, start_page=1, end_page=None, expected_script=None):
+    if expected_script is None:
+        expected_script = script_hint_from_filename(pdf_path)
+
+    segments = []
+    page_texts = extract_page_texts(pdf_path, start_page, end_page)
+    for page_num, text in enumerate(page_texts, start=start_page):
+        kind = "local" if classify_page_text(text, expected_script) == "text" else "remote"
+        if segments and segments[-1][0] == kind and segments[-1][2] == page_num - 1:
+            previous = segments[-1]
+            texts = previous[3] + [text] if kind == "local" else None
+            segments[-1] = (kind, previous[1], page_num, texts)
+        else:
+            segments.append((kind, page_num, page_num, [text] if kind == "local" else None))
+    return segments
+
+
+# Split a page's text layer into paragraphs: blank lines always break, and a line
+# ending in terminal punctuation that stops well short of the page width ends one
+def split_paragraphs(page_text):
+    lines = [line.strip() for line in page_text.splitlines()]
+    width = max((len(line) for line in lines), default=0)
+
+    paragraphs, current = [], []
+    for line in lines:
+        if not line:
+            if current:
+                paragraphs.append(" ".join(current))
+                current = []
+            continue
+        current.append(line)
+        if line[-1] in ".:;?!" and len(line) < 0.8 * width:
+            paragraphs.append(" ".join(current))
+            current = []
+    if current:
+        paragraphs.append(" ".join(current))
+    return paragraphs
+
+
+# Local pages in the same JSONL shape the extractors produce
+def page_texts_to_jsonl(page_texts):
+    return "\n".join(
+        json.dumps({"paragraph": paragraph}, ensure_ascii=False)
+        for text in page_texts
+        for paragraph in iter_normalized(split_paragraphs(text))
+    )
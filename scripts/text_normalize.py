@@ -0,0 +1,129 @@
+import re
+import time
+import random
+import argparse
+import unicodedata
+from functools import lru_cache
+
+# Invisible characters that only break cache keys, dedup and tokenization: BOM,
+# zero-width space and soft hyphen. ZWJ/ZWNJ are kept, Sinhala conjuncts need them.
+DROPPED_CHARACTERS = ("\ufeff", "\u200b", "\u00ad")
+
+# Distinct words seen by the NFC cache; paragraphs repeat a small vocabulary, so
+# almost every word is a cache hit
+NFC_CACHE_SIZE = 1 << 17
+
+
+# Whitespace never composes with a neighbouring character, so NFC of a
+# whitespace-separated word is the same as NFC of it inside the paragraph
+@lru_cache(maxsize=NFC_CACHE_SIZE)
+def _nfc_word(word):
+    return unicodedata.normalize("NFC", word)
+
+
+# The one paragraph normalization every stage applies: Unicode NFC (Tamil and Sinhala
+# vowel signs arrive both precomposed and decomposed from different PDF producers),
+# invisible characters dropped, whitespace runs collapsed to one space, runs of "."
+# or "," collapsed to one, and the ends stripped. Same result as the six-pass
+# cleaner it replaced (_six_pass_clean) for NFC input. Non-strings are returned unchanged.
+def normalize_text(text):
+    if not isinstance(text, str):
+        return text
+    # str.split() splits on the same Unicode whitespace as \s, in C
+    if text.isascii():
+        text = " ".join(text.split())
+    else:
+        for char in DROPPED_CHARACTERS:
+            if char in text:
+                text = text.replace(char, "")
+        text = " ".join(map(_nfc_word, text.split()))
+    while ".." in text:
+        text = text.replace("..", ".")
+    while ",," in text:
+        text = text.replace(",,", ",")
+    return text
+
+
+# normalize_text for a list of paragraphs
+def normalize_batch(texts):
+    normalize = normalize_text
+    return [normalize(text) for text in texts]
+
+
+# Stream normalized paragraphs; empty ones are skipped unless keep_empty is set
+def iter_normalized(texts, keep_empty=False):
+    normalize = normalize_text
+    for text in texts:
+        text = normalize(text)
+        if text or keep_empty:
+            yield text
+
+
+# Normalize each line of a multi-line document (e.g. OCR output) and drop empty lines,
+# keeping the line structure
+def normalize_document(text):
+    return "\n".join(iter_normalized(text.splitlines()))
+
+
+# The previous six-pass cleaner, kept for the benchmark comparison
+def _six_pass_clean(text):
+    text = text.strip()
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"\n{2,}", "\n", text)
+    text = re.sub(r"(\.){2,}", ".", text)
+    text = re.sub(r"(,){2,}", ",", text)
+    text = re.sub(r"\n\s*\n", "\n", text)
+    return text
+
+
+# Synthetic English, Tamil and Sinhala paragraphs with the noise seen in extracted
+# text: doubled spaces, line breaks, "..", ",," and decomposed vowel signs
+def synthetic_paragraphs(count, seed=0):
+    rng = random.Random(seed)
+    words = [
+        "the", "Appropriation", "Act", "section", "court", "shall", "payment",
+        "மேன்முறையீடு", "நீதிமன்றம்", "கொடுப்பனவு", "சட்டம்",
+        "අභියාචනාධිකරණය", "ගෙවීම", "පනත", "ශ්‍රී",
+    ]
+    noise = [" ", "  ", "\n", " \t", "..", ",,", ", ", ". "]
+    paragraphs = []
+    for _ in range(count):
+        parts = []
+        for _ in range(rng.randint(8, 60)):
+            word = rng.choice(words)
+            if rng.random() < 0.1:
+                word = unicodedata.normalize("NFD", word)
+            parts.append(word + rng.choice(noise))
+        paragraphs.append("".join(parts))
+    return paragraphs
+
+
+def benchmark(count=200000, repeat=3):
+    paragraphs = synthetic_paragraphs(count)
+    report = {"paragraphs": count, "mean_chars": sum(map(len, paragraphs)) / max(count, 1)}
+    for name, fn in (("six_pass_regex", lambda texts: [_six_pass_clean(t) for t in texts]),
+                     ("normalize_batch", normalize_batch)):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn(paragraphs)
+            best = min(best, time.perf_counter() - start)
+        report[name] = {"seconds": round(best, 3), "paragraphs_per_minute": int(count / best * 60)}
+    report["speedup"] = round(report["six_pass_regex"]["seconds"] / report["normalize_batch"]["seconds"], 2)
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmark of paragraph normalization throughput.")
+    parser.add_argument("--paragraphs", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = benchmark(args.paragraphs, args.repeat)
+    print(f"{report['paragraphs']} paragraphs, {report['mean_chars']:.0f} characters on average")
+    for name in ("six_pass_regex", "normalize_batch"):
+        print(f"{name:>16}: {report[name]['seconds']:.3f}s, {report[name]['paragraphs_per_minute']:,} paragraphs/minute")
+    print(f"Speedup: {report['speedup']}x")
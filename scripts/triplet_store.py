@@ -0,0 +1,121 @@
+import os
+import sys
+import json
+import shutil
+
+import numpy as np
+
+from alignment_engine import triplet_record
+
+STORE_SUFFIX = ".tstore"
+SCORE_COLUMNS = ("eng_tam", "eng_sin", "tam_sin", "combined_avg")
+TEXT_COLUMNS = ("english", "tamil", "sinhala")
+LANGS = ("eng", "tam", "sin")
+
+
+# Columnar form of an aligned_triplets file, one directory per group:
+#   scores.npy       n x 4 float32, columns SCORE_COLUMNS
+#   offsets.npy      3n + 1 int64 byte offsets into texts.bin, row-major over TEXT_COLUMNS
+#   texts.bin        the UTF-8 texts back to back
+#   emb_<lang>.npy   optional n x dim float16 embeddings per language
+#   meta.json        row count and column names
+# Everything is opened memory-mapped, so thresholds and statistics touch only scores.npy.
+def write_triplet_store(path, records, embeddings=None):
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    scores = np.array(
+        [[r["similarity"][c] for c in SCORE_COLUMNS] for r in records], dtype=np.float32
+    ).reshape(-1, len(SCORE_COLUMNS))
+    blobs = [r[c].encode("utf-8") for r in records for c in TEXT_COLUMNS]
+    offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in blobs], out=offsets[1:])
+
+    np.save(os.path.join(tmp_path, "scores.npy"), scores)
+    np.save(os.path.join(tmp_path, "offsets.npy"), offsets)
+    with open(os.path.join(tmp_path, "texts.bin"), "wb") as f:
+        for blob in blobs:
+            f.write(blob)
+    if embeddings is not None:
+        for lang, vectors in zip(LANGS, embeddings):
+            np.save(os.path.join(tmp_path, f"emb_{lang}.npy"), np.asarray(vectors, dtype=np.float16))
+    with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"rows": len(records), "scores": SCORE_COLUMNS, "texts": TEXT_COLUMNS,
+                   "embeddings": embeddings is not None}, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+class TripletStore:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.scores = np.load(os.path.join(path, "scores.npy"), mmap_mode="r")
+        self._offsets = None
+        self._texts = None
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def column(self, name):
+        return self.scores[:, SCORE_COLUMNS.index(name)]
+
+    # Rows whose every listed score is above its threshold; reads only the score table
+    def mask(self, thresholds):
+        keep = np.ones(len(self), dtype=bool)
+        for name, threshold in thresholds.items():
+            keep &= self.column(name) > threshold
+        return keep
+
+    def _open_texts(self):
+        if self._texts is None:
+            self._offsets = np.load(os.path.join(self.path, "offsets.npy"), mmap_mode="r")
+            if os.path.getsize(os.path.join(self.path, "texts.bin")):
+                self._texts = np.memmap(os.path.join(self.path, "texts.bin"), dtype=np.uint8, mode="r")
+            else:
+                self._texts = np.zeros(0, dtype=np.uint8)
+
+    def _text(self, k):
+        start, end = self._offsets[k], self._offsets[k + 1]
+        return self._texts[start:end].tobytes().decode("utf-8")
+
+    # (english, tamil, sinhala) for each row index, decoding only those rows
+    def texts(self, rows):
+        self._open_texts()
+        return [tuple(self._text(3 * int(i) + c) for c in range(len(TEXT_COLUMNS))) for i in rows]
+
+    # Rows in the aligned_triplets JSON schema
+    def records(self, rows=None):
+        rows = range(len(self)) if rows is None else rows
+        return [
+            triplet_record(*texts, *self.scores[i, :3])
+            for i, texts in zip(rows, self.texts(rows))
+        ]
+
+    def embeddings(self, lang):
+        path = os.path.join(self.path, f"emb_{lang}.npy")
+        return np.load(path, mmap_mode="r") if os.path.exists(path) else None
+
+    def stats(self, quantiles=(0.1, 0.5, 0.9)):
+        out = {"rows": len(self)}
+        for name in SCORE_COLUMNS:
+            values = np.asarray(self.column(name), dtype=np.float64)
+            if len(values) == 0:
+                out[name] = {}
+                continue
+            out[name] = {"mean": round(float(values.mean()), 4), "min": round(float(values.min()), 4),
+                         "max": round(float(values.max()), 4)}
+            for q, value in zip(quantiles, np.quantile(values, quantiles)):
+                out[name][f"p{int(q * 100)}"] = round(float(value), 4)
+        return out
+
+
+# Print score statistics of one or more stores without decoding any text
+if __name__ == "__main__":
+    for store_path in sys.argv[1:]:
+        print(store_path)
+        print(json.dumps(TripletStore(store_path).stats(), indent=2))